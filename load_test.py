@@ -0,0 +1,285 @@
+import asyncio
+import argparse
+import re
+import threading
+import time
+from textwrap import dedent
+
+import numpy as np
+import pandas as pd
+
+import main
+from main import global_settings, col_letters_to_num
+
+
+class Executable:
+    """Mimic a Google API request: execute() returns the result after the simulated API latency."""
+
+    def __init__(self, sheet, action):
+        self.sheet = sheet
+        self.action = action
+
+    def execute(self):
+        time.sleep(self.sheet.api_latency)
+        with self.sheet.lock:
+            self.sheet.n_requests += 1
+            return self.action()
+
+
+class LocalSheet:
+    """Thread-safe in-memory stand-in for the Google Sheets service used by main.py.
+
+    It implements the subset of the Sheets API used by the game, adds a fixed latency to each
+    request, and records when each cell of the 'Profits' sheet is first filled, and whether a
+    filled profit is later changed (a round processed twice).
+    """
+
+    def __init__(self, api_latency=0.05):
+        self.api_latency = api_latency
+        self.lock = threading.Lock()
+        self.grid = {}
+        self.n_requests = 0
+        self.filled = {}
+        self.changed_after_fill = []
+
+    # --- direct cell access, as students editing the sheet in their browser ---
+    def set_cell(self, sheet_name, row, col, value):
+        with self.lock:
+            self.grid.setdefault(sheet_name, {})[(row, col)] = value
+
+    def get_cell(self, sheet_name, row, col):
+        with self.lock:
+            return self.grid.get(sheet_name, {}).get((row, col), '')
+
+    # --- range helpers ---
+    def parse_range(self, range_name):
+        sheet_name, cells = range_name.rsplit('!', 1)
+        bounds = []
+        for part in cells.split(':'):
+            col, row = re.match(r'([A-Z]*)(\d*)', part).groups()
+            bounds.append((col_letters_to_num(col) if col else None, int(row) if row else None))
+        start = bounds[0]
+        end = bounds[1] if len(bounds) > 1 else (None, None)
+        return sheet_name, start, end
+
+    def read(self, range_name):
+        sheet_name, (c0, r0), (c1, r1) = self.parse_range(range_name)
+        cells = self.grid.get(sheet_name, {})
+        if r1 is None:
+            r1 = max([r for r, _ in cells] + [r0])
+        values = []
+        for r in range(r0, r1 + 1):
+            row = [cells.get((r, c), '') for c in range(c0, (c1 or c0) + 1)]
+            while row and row[-1] == '':
+                row.pop()
+            values.append(row)
+        # like the API, trailing empty rows are not returned
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def write(self, range_name, values):
+        sheet_name, (c0, r0), _ = self.parse_range(range_name)
+        cells = self.grid.setdefault(sheet_name, {})
+        now = time.perf_counter()
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                key = (r0 + i, c0 + j)
+                if sheet_name == 'Profits' and value != '':
+                    previous = self.filled.get(key)
+                    if previous is None:
+                        self.filled[key] = (now, value)
+                    elif previous[1] != value and key[1] <= main.N_ROUNDS + 2:
+                        self.changed_after_fill.append((key, previous[1], value))
+                cells[key] = value
+
+    def clear_cells(self, range_name):
+        sheet_name, (c0, r0), (c1, r1) = self.parse_range(range_name)
+        cells = self.grid.setdefault(sheet_name, {})
+        for (r, c) in list(cells):
+            if r >= r0 and (r1 is None or r <= r1) and c >= c0 and (c1 is None or c <= c1):
+                del cells[(r, c)]
+
+    # --- Sheets API ---
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range=None):
+        if range is None:
+            return Executable(self, lambda: {'sheets': [{'properties': {'title': name}} for name in self.grid]})
+        return Executable(self, lambda: {'values': self.read(range)})
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        return Executable(self, lambda: self.write(range, body['values']))
+
+    def batchUpdate(self, spreadsheetId, body):
+        if 'data' in body:
+            return Executable(self, lambda: [self.write(d['range'], d['values']) for d in body['data']])
+        # spreadsheet level update, only used to add sheets
+        def add_sheets():
+            for request in body.get('requests', []):
+                self.grid.setdefault(request['addSheet']['properties']['title'], {})
+        return Executable(self, add_sheets)
+
+    def clear(self, spreadsheetId, range, body):
+        return Executable(self, lambda: self.clear_cells(range))
+
+    def batchClear(self, spreadsheetId, body):
+        return Executable(self, lambda: [self.clear_cells(r) for r in body['ranges']])
+
+
+async def student(sheet, row, rng, settings, game_over, log):
+    """Simulate a student: after each published round, submit a price after a random delay, sometimes twice."""
+    low, high = settings['price_range']
+    for round_num in range(1, main.N_ROUNDS + 1):
+        # wait until the previous round's profit is published in the student's sheet
+        if round_num > 1:
+            while sheet.get_cell('Profits', row, round_num + 1) == '':
+                if game_over.is_set():
+                    return
+                await asyncio.sleep(settings['student_poll'])
+        if rng.random() < settings['p_miss']:
+            continue
+        await asyncio.sleep(rng.lognormal(np.log(settings['median_arrival']), settings['sigma_arrival']))
+        n_submissions = 2 if rng.random() < settings['p_overwrite'] else 1
+        for _ in range(n_submissions):
+            if game_over.is_set():
+                return
+            price = round(float(rng.uniform(low, high)), 1)
+            sheet.set_cell('Pricing', row, round_num + 2, str(price))
+            log.append((row, round_num, time.perf_counter(), price))
+            await asyncio.sleep(rng.exponential(settings['median_arrival'] / 2))
+
+
+async def game_loop(settings, game_over, advance_log):
+    """Advance rounds like an instructor: soft updates every poll interval, a hard update at each deadline."""
+    round_deadline = None
+    binding_round = 1
+    round_num = 1
+    while True:
+        df_protected = global_settings['df_protected']
+        current = df_protected.loc[df_protected['student_round'] > 0, 'student_round'].min()
+        current = 1 if pd.isna(current) else current
+        if current > main.N_ROUNDS:
+            break
+        if round_deadline is None or current != binding_round:
+            binding_round = current
+            round_deadline = time.perf_counter() + settings['round_duration']
+        await asyncio.sleep(settings['advance_poll'])
+        hard = time.perf_counter() >= round_deadline
+        # like the instructor, wait for the class to submit its first prices before pairing
+        if global_settings['df_pairs'] is None and not hard:
+            continue
+        global_settings['round_num'] = round_num
+        start = time.perf_counter()
+        await asyncio.to_thread(main.advance_round, hard)
+        advance_log.append((hard, time.perf_counter() - start))
+        round_num += 1
+        if hard:
+            round_deadline = time.perf_counter() + settings['round_duration']
+    game_over.set()
+
+
+def summarize(sheet, submissions, advance_log, n_students, elapsed):
+    """Match submissions to published profits and summarize latency, throughput and anomalies."""
+    df_submissions = pd.DataFrame(submissions, columns=['row', 'round', 'time', 'price'])
+    published = {(row, col - 2): t for (row, col), (t, _) in sheet.filled.items() if 3 <= col <= main.N_ROUNDS + 2}
+    df_submissions['published'] = [published.get((row, r), np.nan) for row, r in zip(df_submissions['row'], df_submissions['round'])]
+    on_time = df_submissions['time'] <= df_submissions['published']
+    # the submission that counted is the last one before the round was published
+    df_used = df_submissions[on_time].sort_values('time').groupby(['row', 'round']).tail(1)
+    latency = (df_used['published'] - df_used['time']).to_numpy()
+
+    df_protected = global_settings['df_protected']
+    profit_cols = [f'Round{r}_Profit' for r in range(1, main.N_ROUNDS + 1)]
+    round_profits = df_protected[profit_cols].apply(pd.to_numeric, errors='coerce')
+    profit_mismatch = (round_profits.sum(axis=1) - df_protected['Total Profit']).abs() > 0.5
+    unpaired = int((df_protected['student_round'] == 0).sum())
+
+    print(dedent(f"""
+    ===== Load test: {n_students} students, {elapsed:.1f}s =====
+    Submissions:            {len(df_submissions)} ({df_submissions.groupby(['row', 'round']).size().gt(1).sum()} overwritten)
+    Rounds published:       {len(published)}
+    Throughput:             {len(df_used) / elapsed:.1f} counted submissions/s
+    Latency to profit (s):  p50 {np.percentile(latency, 50):.2f}  p90 {np.percentile(latency, 90):.2f}  p99 {np.percentile(latency, 99):.2f}  max {latency.max():.2f}
+    Advances:               {len(advance_log)} ({sum(h for h, _ in advance_log)} hard), mean {np.mean([d for _, d in advance_log]):.3f}s, max {max(d for _, d in advance_log):.3f}s
+    API requests:           {sheet.n_requests}
+    Lost submissions:       {int(df_submissions['published'].isna().sum())} (round never published)
+    Late overwrites:        {int((~on_time & df_submissions['published'].notna()).sum())} (after the round was published)
+    Unpaired students:      {unpaired}
+    Double-counted rounds:  {len(sheet.changed_after_fill)} (published profit changed)
+    Total profit mismatches: {int(profit_mismatch.sum())}
+    """))
+    return
+
+
+async def run(settings):
+    sheet = LocalSheet(api_latency=settings['api_latency'])
+    n_students = settings['n_students']
+    sheet.set_cell('Pricing', 1, 1, 'Name')
+    for i in range(n_students):
+        sheet.set_cell('Pricing', i + 2, 1, f'Student {i + 1}')
+        sheet.set_cell('Pricing', i + 2, 2, f'id{i + 1}')
+    for sheet_name in ['Rival Prices', 'Market Shares', 'Profits', 'GameResults']:
+        sheet.grid.setdefault(sheet_name, {})
+
+    global_settings['service'] = sheet
+    global_settings['SPREADSHEET_ID'] = 'load-test'
+    global_settings['section_name'] = 'load-test'
+    global_settings['plot_mode'] = 'none'
+    global_settings['mode'] = 'hotelling'
+    global_settings['game_settings'] = {'t': 1, 'c': 0, 'v': 200}
+    global_settings['game_abbrev'] = 'hotelling_t1_c0_v200'
+    global_settings['extra_price_plot_lines'] = main.DEMAND_MODELS['hotelling']['benchmarks'](global_settings['game_settings'])
+    main.load_students()
+    main.demand_and_profits_array(np.zeros(1), np.zeros(1))
+
+    rng = np.random.default_rng(settings['seed'])
+    submissions = []
+    advance_log = []
+    game_over = asyncio.Event()
+    start = time.perf_counter()
+    students = [student(sheet, i + 2, np.random.default_rng(rng.integers(2 ** 32)), settings, game_over, submissions)
+                for i in range(n_students)]
+    await asyncio.gather(game_loop(settings, game_over, advance_log), *students)
+    summarize(sheet, submissions, advance_log, n_students, time.perf_counter() - start)
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=dedent("""
+    ===== Dynamic Pricing Lab Load Test =====
+    Runs a full game against a local stand-in of the Google Sheet, with simulated students
+    submitting (and sometimes overwriting) prices at random times while rounds are advanced:
+    soft updates every poll interval and a hard update at each round deadline.
+    Reports the latency from submission to published profit, throughput, and lost or
+    double-counted rounds.
+    """), formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--students", type=int, default=100, help="number of simulated students")
+    parser.add_argument("--round-duration", type=float, default=3.0, help="seconds before a round is hard-advanced")
+    parser.add_argument("--median-arrival", type=float, default=0.8, help="median seconds before a student submits")
+    parser.add_argument("--sigma-arrival", type=float, default=0.6, help="log-normal dispersion of submission times")
+    parser.add_argument("--p-overwrite", type=float, default=0.15, help="probability a student submits twice")
+    parser.add_argument("--p-miss", type=float, default=0.05, help="probability a student skips a round")
+    parser.add_argument("--advance-poll", type=float, default=0.25, help="seconds between soft updates")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds added to each API request")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    benchmarks = main.DEMAND_MODELS['hotelling']['benchmarks']({'t': 1, 'c': 0, 'v': 200})
+    asyncio.run(run({
+        'n_students': args.students,
+        'round_duration': args.round_duration,
+        'median_arrival': args.median_arrival,
+        'sigma_arrival': args.sigma_arrival,
+        'p_overwrite': args.p_overwrite,
+        'p_miss': args.p_miss,
+        'advance_poll': args.advance_poll,
+        'api_latency': args.api_latency,
+        'student_poll': 0.02,
+        'seed': args.seed,
+        'price_range': (benchmarks['NE'] * 0.8, benchmarks['Monopoly'] * 1.1)
+    }))
@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
 import random
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
 import argparse
 from textwrap import dedent
 from googleapiclient.discovery import build
@@ -10,6 +11,24 @@ from google.auth.transport.requests import Request
 import pickle
 import os.path
 import warnings
+import io
+import html
+import threading
+import shutil
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import glob
+import hashlib
+import re
+import json
+import sqlite3
+from contextlib import closing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 # silence future warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -18,12 +37,26 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 # If modifying these scopes, delete the file token.pickle.
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
+# registry of the sections, their sheets and their last games
+SETTINGS_DB = 'settings.sqlite'
+
+# Sheets I/O is paged so that large sections stay under the per-request payload limits
+PAGE_ROWS = 2000
+PAGE_CELLS = 40000
+N_ROUNDS = 10
+
+# currency symbols and codes students may type around their prices
+CURRENCIES = r'(?:[$€£¥]|USD|EUR|GBP|CHF|JPY|CAD|AUD)'
+CURRENCY_PREFIX = rf'(?i)^{CURRENCIES}\s*'
+CURRENCY_SUFFIX = rf'(?i)\s*{CURRENCIES}$'
+
 
 # global setting holder
 global_settings = {
     'service': None,
     'SPREADSHEET_ID': None,
     'section_name': None,
+    'section_record': None,
     'df_students': None,
     'df_pairs': None,
     'df_protected': None,
@@ -34,7 +67,23 @@ global_settings = {
     'residual_student': None,
     'id_to_name': None,
     'today': pd.Timestamp.now().strftime('%Y-%m-%d'),
-    'extra_price_plot_lines': {}
+    'extra_price_plot_lines': {},
+    'price_bounds': (0.0, 1000.0),
+    'price_issues': None,
+    'df_prices': None,
+    'data_version': 0,
+    'plot_state': None,
+    'plot_mode': 'pairs',
+    'journal': {'undo': [], 'redo': []},
+    'bot': None
+}
+
+# rendered dashboard artifacts, keyed by path and tagged with the signature of the data they show
+dashboard_cache = {
+    'entries': {},
+    'path_locks': {},
+    'signatures': None,
+    'lock': threading.Lock()
 }
 
 
@@ -71,103 +120,377 @@ def convert_to_serializable(obj):
     else:
         return obj
 
-def demand_and_profits(p1, p2):
-    # Demand functions
-    mode = global_settings['mode']
+# registered demand models, see register_demand_model
+DEMAND_MODELS = {}
+
+
+def compile_kernel(kernel):
+    """JIT-compile an array demand kernel with numba when available, otherwise use it as is."""
+    if numba is None:
+        return kernel
+    return numba.njit(cache=True)(kernel)
+
+def register_demand_model(name, label, params, kernel, benchmarks, presets=None):
+    """Register a demand model that can be selected when starting a game.
+
+    Args:
+        name (str): The model key, used as the game mode and in the game abbreviation.
+        label (str): The name shown in the game mode menu.
+        params (list): (parameter name, prompt, default) tuples, in the order the kernel takes them.
+            All models must include the marginal cost 'c'.
+        kernel (callable): Array function kernel(p1, p2, *params) -> (s1_market_share, s2_market_share)
+            written with NumPy operations only, so that numba can compile it.
+        benchmarks (callable): Function of the game settings returning the reference prices
+            (e.g. 'NE' and 'Monopoly') drawn on the average price plot.
+        presets (list, optional): (label, game settings) tuples offered before a custom setup.
+    """
+    DEMAND_MODELS[name] = {
+        'label': label,
+        'params': params,
+        'kernel': compile_kernel(kernel),
+        'benchmarks': benchmarks,
+        'presets': presets or []
+    }
+    return
+
+def bertrand_shares(p1, p2, alpha):
+    # winner takes all, market share depends inversely on price
     total_demand = 100
-    cost = global_settings['game_settings']['c']
-    s1_market_share, s2_market_share = 0, 0
-    if mode == 'bertrand':
-        # Market share depends inversely on price
-        slope = global_settings['game_settings']['alpha']
-        # winner takes all
-        if p1 < p2:
-            s1_market_share = np.clip(1 - slope * p1 / total_demand, 0, 1.0)
-            s2_market_share = 0
-        elif p1 > p2:
-            s1_market_share = 0
-            s2_market_share = np.clip(1 - slope * p2 / total_demand, 0.0, 1.0)
-        else:
-            s1_market_share = s2_market_share = np.clip((1 - slope * p1 / total_demand) / (2.0), 0.0, 0.5)
-    elif mode == 'hotelling':
-        # low transport hotelling. NE c+t, monopoly = v/2
-        t = global_settings['game_settings']['t']
-        v = global_settings['game_settings']['v']
-        # u1(xM) = u2(xM)
-        xM = (-p1 + p2 + 100 * t) / (2 * t)
-        # u1(xA0) = 0
-        xA0 = (v - p1) / t
-        # u2(xB0) = 0
-        xB0 = 100 - (v - p2) / t
-        
-        if xA0 < xB0:
-            s1_market_share = np.clip(xA0 / 100, 0.0, 1.0)
-            s2_market_share = np.clip((100 - xB0) / 100, 0.0, 1.0)
-        else:
-            s1_market_share = np.clip(xM, 0, 100) / 100
-            s2_market_share = 1.0 - s1_market_share    
-        
-    else:
+    s1_alone = np.minimum(np.maximum(1 - alpha * p1 / total_demand, 0.0), 1.0)
+    s2_alone = np.minimum(np.maximum(1 - alpha * p2 / total_demand, 0.0), 1.0)
+    s1_market_share = np.where(p1 < p2, s1_alone, np.where(p1 > p2, 0.0, s1_alone / 2.0))
+    s2_market_share = np.where(p2 < p1, s2_alone, np.where(p2 > p1, 0.0, s2_alone / 2.0))
+    return s1_market_share, s2_market_share
+
+def hotelling_shares(p1, p2, t, v):
+    # firms at the edges of a line of 100 consumers
+    # u1(xM) = u2(xM)
+    xM = (-p1 + p2 + 100 * t) / (2 * t)
+    # u1(xA0) = 0
+    xA0 = (v - p1) / t
+    # u2(xB0) = 0
+    xB0 = 100 - (v - p2) / t
+    covered_s1 = np.minimum(np.maximum(xM, 0.0), 100.0) / 100
+    s1_market_share = np.where(xA0 < xB0, np.minimum(np.maximum(xA0 / 100, 0.0), 1.0), covered_s1)
+    s2_market_share = np.where(xA0 < xB0, np.minimum(np.maximum((100 - xB0) / 100, 0.0), 1.0), 1.0 - covered_s1)
+    return s1_market_share, s2_market_share
+
+def logit_shares(p1, p2, v, mu):
+    # multinomial logit with an outside option of utility zero
+    u1 = (v - p1) / mu
+    u2 = (v - p2) / mu
+    u_max = np.maximum(np.maximum(u1, u2), 0.0)
+    e0 = np.exp(-u_max)
+    e1 = np.exp(u1 - u_max)
+    e2 = np.exp(u2 - u_max)
+    denominator = e0 + e1 + e2
+    return e1 / denominator, e2 / denominator
+
+def linear_bertrand_shares(p1, p2, a, b, d):
+    # linear differentiated demand q_i = a - b p_i + d p_j, as a share of the 100 consumers
+    s1_market_share = np.minimum(np.maximum((a - b * p1 + d * p2) / 100, 0.0), 1.0)
+    s2_market_share = np.minimum(np.maximum((a - b * p2 + d * p1) / 100, 0.0), 1.0)
+    return s1_market_share, s2_market_share
+
+def edgeworth_shares(p1, p2, alpha, k):
+    # homogenous Bertrand where each firm can serve at most a share k of the market,
+    # with efficient rationing of the residual demand to the high price firm
+    d1 = np.minimum(np.maximum(1 - alpha * p1 / 100, 0.0), 1.0)
+    d2 = np.minimum(np.maximum(1 - alpha * p2 / 100, 0.0), 1.0)
+    s1_market_share = np.where(p1 < p2, np.minimum(k, d1),
+                               np.where(p1 > p2, np.minimum(k, np.maximum(d1 - k, 0.0)), np.minimum(k, d1 / 2)))
+    s2_market_share = np.where(p2 < p1, np.minimum(k, d2),
+                               np.where(p2 > p1, np.minimum(k, np.maximum(d2 - k, 0.0)), np.minimum(k, d2 / 2)))
+    return s1_market_share, s2_market_share
+
+def market_shares(p1, p2, mode=None, game_settings=None):
+    """Compute the market shares for arrays of prices with the kernel of a demand model.
+
+    Args:
+        p1 (array-like): Prices of the first student(s).
+        p2 (array-like): Prices of the second student(s).
+        mode (str, optional): The demand model. Defaults to the current game mode.
+        game_settings (dict, optional): The model parameters. Defaults to the current game settings.
+
+    Returns:
+        tuple: The market shares (between 0 and 1) of the first and second student(s).
+    """
+    mode = global_settings['mode'] if mode is None else mode
+    game_settings = global_settings['game_settings'] if game_settings is None else game_settings
+    if mode not in DEMAND_MODELS:
         raise ValueError("Invalid mode.")
+    model = DEMAND_MODELS[mode]
+    params = tuple(float(game_settings[name]) for name, _, _ in model['params'] if name != 'c')
+    p1 = np.atleast_1d(np.asarray(p1, dtype=float))
+    p2 = np.atleast_1d(np.asarray(p2, dtype=float))
+    p1, p2 = np.broadcast_arrays(p1, p2)
+    return model['kernel'](np.ascontiguousarray(p1), np.ascontiguousarray(p2), *params)
 
-    # Profits
-    s1_profit = s1_market_share * (p1 - cost) * total_demand
-    s2_profit = s2_market_share * (p2 - cost) * total_demand
+def demand_and_profits_array(p1, p2, mode=None, game_settings=None):
+    """Vectorized version of demand_and_profits, for bulk simulation.
+
+    Returns:
+        tuple: ((s1 market share, s1 profit), (s2 market share, s2 profit)) as float arrays, without rounding.
+    """
+    game_settings = global_settings['game_settings'] if game_settings is None else game_settings
+    total_demand = 100
+    cost = game_settings['c']
+    s1_market_share, s2_market_share = market_shares(p1, p2, mode, game_settings)
+    s1_profit = s1_market_share * (np.asarray(p1, dtype=float) - cost) * total_demand
+    s2_profit = s2_market_share * (np.asarray(p2, dtype=float) - cost) * total_demand
+    return (s1_market_share, s1_profit), (s2_market_share, s2_profit)
+
+def demand_and_profits(p1, p2):
+    (s1_market_share, s1_profit), (s2_market_share, s2_profit) = demand_and_profits_array(p1, p2)
     
     # Return profits rounded to 1 decimal
-    s1_profit = round(s1_profit, 1)
-    s2_profit = round(s2_profit, 1)
+    s1_profit = round(float(s1_profit[0]), 1)
+    s2_profit = round(float(s2_profit[0]), 1)
     # and shares in percentage
-    s1_market_share = f"{s1_market_share:.1%}"
-    s2_market_share = f"{s2_market_share:.1%}"
+    s1_market_share = f"{float(s1_market_share[0]):.1%}"
+    s2_market_share = f"{float(s2_market_share[0]):.1%}"
 
     return (s1_market_share, s1_profit), (s2_market_share, s2_profit)
 
-def register_section(section_name, section_sheet_id):
-    """Register a section with the given name and sheet ID."""
-    # load the settings
-    if os.path.exists('settings.pickle'):
-        with open('settings.pickle', 'rb') as settings_file:
-            settings = pickle.load(settings_file)
+def numeric_benchmarks(mode, game_settings, max_price=None, n_grid=4001):
+    """Find the symmetric joint-monopoly price and the symmetric NE on a price grid.
+
+    The NE is found by iterating best responses and is only reported if the iteration converges.
+    """
+    cost = game_settings['c']
+    max_price = cost + 400 if max_price is None else max_price
+    grid = np.linspace(cost, max_price, n_grid)
+    step = grid[1] - grid[0]
+    (s1_share, _), (s2_share, _) = demand_and_profits_array(grid, grid, mode, game_settings)
+    monopoly = grid[np.argmax((s1_share + s2_share) * (grid - cost))]
+    benchmarks = {}
+    price = monopoly
+    for _ in range(500):
+        (_, profits), _ = demand_and_profits_array(grid, np.full_like(grid, price), mode, game_settings)
+        best_response = grid[np.argmax(profits)]
+        if abs(best_response - price) <= step:
+            benchmarks['NE'] = round(float(best_response), 2)
+            break
+        price = best_response
+    benchmarks['Monopoly'] = round(float(monopoly), 2)
+    return benchmarks
+
+def hotelling_benchmarks(game_settings):
+    t, c, v = game_settings['t'], game_settings['c'], game_settings['v']
+    # the joint monopoly covers the market if the local monopoly reaches the middle consumer
+    covered = (v - c) / (2 * t) >= 50
+    monopoly = v - 50 * t if covered else (v + c) / 2.0
+    if not covered:
+        # the firms do not compete, each one is a local monopoly
+        ne = (v + c) / 2.0
+    elif v >= c + 150 * t:
+        # the middle consumer still buys at the competitive price
+        ne = c + 100 * t
     else:
-        settings = {}
-        
-    # Register the section
-    settings[section_name] = section_sheet_id
-    # Save the settings
-    with open('settings.pickle', 'wb') as settings_file:
-        pickle.dump(settings, settings_file)
+        # kinked demand: both firms price so that the middle consumer is just indifferent to buying
+        ne = v - 50 * t
+    return {'NE': ne, 'Monopoly': monopoly}
+
+def edgeworth_benchmarks(game_settings):
+    alpha, c, k = game_settings['alpha'], game_settings['c'], game_settings['k']
+    # price at which both capacities are sold out, an NE only if undercut-free and no firm wants to raise it
+    clearing = max(c, 100 * (1 - 2 * k) / alpha)
+    monopoly = max((100 / alpha + c) / 2.0, clearing)
+    prices = np.linspace(clearing, max(100 / alpha, clearing), 2001)
+    (_, deviation_profits), _ = demand_and_profits_array(prices, np.full_like(prices, clearing), 'edgeworth', game_settings)
+    label = 'NE' if deviation_profits.max() <= deviation_profits[0] + 1e-9 else 'Market clearing'
+    return {label: clearing, 'Monopoly': monopoly}
+
+
+register_demand_model(
+    'bertrand', 'Homogenous Bertrand',
+    params=[('alpha', 'Choose the demand slope parameter alpha', 1),
+            ('c', 'Choose the marginal cost c', 0)],
+    kernel=bertrand_shares,
+    benchmarks=lambda gs: {'NE': gs['c'], 'Monopoly': (100 / gs['alpha'] + gs['c']) / 2.0}
+)
+register_demand_model(
+    'hotelling', 'Hotelling',
+    params=[('t', 'Choose the transport cost t', 1),
+            ('c', 'Choose the marginal cost c', 0),
+            ('v', 'Choose the consumer valuation v', 4)],
+    kernel=hotelling_shares,
+    benchmarks=hotelling_benchmarks,
+    presets=[('High transport cost (t=1, c=0, v=200)', {'t': 1, 'c': 0, 'v': 200}),
+             ('Low transport cost (t=.5, c=0, v=200)', {'t': .5, 'c': 0, 'v': 200})]
+)
+register_demand_model(
+    'logit', 'Logit',
+    params=[('v', 'Choose the product quality v', 100),
+            ('mu', 'Choose the taste dispersion mu', 20),
+            ('c', 'Choose the marginal cost c', 0)],
+    kernel=logit_shares,
+    benchmarks=lambda gs: numeric_benchmarks('logit', gs)
+)
+register_demand_model(
+    'linear', 'Linear differentiated Bertrand',
+    params=[('a', 'Choose the demand intercept a', 100),
+            ('b', 'Choose the own-price slope b', 1),
+            ('d', 'Choose the cross-price slope d', 0.5),
+            ('c', 'Choose the marginal cost c', 0)],
+    kernel=linear_bertrand_shares,
+    benchmarks=lambda gs: {'NE': (gs['a'] + gs['b'] * gs['c']) / (2 * gs['b'] - gs['d']),
+                           'Monopoly': (gs['a'] + (gs['b'] - gs['d']) * gs['c']) / (2 * (gs['b'] - gs['d']))}
+)
+register_demand_model(
+    'edgeworth', 'Bertrand-Edgeworth (capacity constrained)',
+    params=[('alpha', 'Choose the demand slope parameter alpha', 1),
+            ('k', 'Choose the capacity of each firm as a share of the market k', 0.4),
+            ('c', 'Choose the marginal cost c', 0)],
+    kernel=edgeworth_shares,
+    benchmarks=edgeworth_benchmarks,
+    presets=[('Tight capacity (alpha=1, k=0.3, c=0)', {'alpha': 1, 'k': 0.3, 'c': 0}),
+             ('Loose capacity (alpha=1, k=0.6, c=0)', {'alpha': 1, 'k': 0.6, 'c': 0})]
+)
+
+def input_number(input_str, default):
+    """Input a number, returning the default if nothing is entered."""
+    while True:
+        value = input(input_str).strip()
+        if len(value) == 0:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            print("Invalid number. Please enter a valid number.")
+
+def prompt_for_game_settings(mode):
+    """Prompt the user for the parameters of a demand model, offering its presets first."""
+    model = DEMAND_MODELS[mode]
+    presets = model['presets']
+    if len(presets) > 0:
+        letters = 'abcdefghijklmnopqrstuvwxyz'[:len(presets) + 1]
+        setting = clean_input(f"Choose a {model['label']} Setup:\n" + "".join(
+            f"({letter}) {label}\n" for letter, (label, _) in zip(letters, presets)
+        ) + f"({letters[-1]}) Custom\n")
+        if setting not in letters:
+            print("Invalid setting selected.")
+            raise ValueError("Invalid setting selected.")
+        if setting != letters[-1]:
+            return dict(presets[letters.index(setting)][1])
+    game_settings = {}
+    for name, prompt, default in model['params']:
+        game_settings[name] = input_number(f"{prompt} (or press Enter for default {default}): ", default)
+    return game_settings
+
+def connect_settings():
+    """Open the section registry, creating it (and importing a legacy settings.pickle) if needed.
+
+    The registry is a SQLite database, so every change is an atomic transaction and concurrent
+    registrations wait on the database lock instead of overwriting each other.
+    """
+    new_registry = not os.path.exists(SETTINGS_DB)
+    conn = sqlite3.connect(SETTINGS_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sections ("
+            " name TEXT PRIMARY KEY,"
+            " sheet_id TEXT NOT NULL,"
+            " term TEXT,"
+            " last_mode TEXT,"
+            " last_game_settings TEXT,"
+            " checkpoint TEXT,"
+            " updated TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sections_term ON sections (term, name)")
+    # import the sections registered before the registry existed
+    if new_registry and os.path.exists('settings.pickle'):
+        with open('settings.pickle', 'rb') as settings_file:
+            legacy_settings = pickle.load(settings_file)
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO sections (name, sheet_id, updated) VALUES (?, ?, ?)",
+                [(name, sheet_id, pd.Timestamp.now().isoformat()) for name, sheet_id in legacy_settings.items()]
+            )
+    return conn
+
+def register_section(section_name, section_sheet_id, term=None):
+    """Register a section with the given name and sheet ID."""
+    with closing(connect_settings()) as conn, conn:
+        # keep the last game settings of a section that is registered again
+        conn.execute(
+            "INSERT INTO sections (name, sheet_id, term, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET sheet_id = excluded.sheet_id, "
+            "term = COALESCE(excluded.term, sections.term), updated = excluded.updated",
+            (section_name, section_sheet_id, term, pd.Timestamp.now().isoformat())
+        )
     print(f"Section {section_name} registered with sheet ID {section_sheet_id}.")
     return
 
-def load_section_settings():
-    """Load the section settings."""
-    if os.path.exists('settings.pickle'):
-        with open('settings.pickle', 'rb') as settings_file:
-            settings = pickle.load(settings_file)
+def remove_section(section_name):
+    """Remove a section from the registry."""
+    with closing(connect_settings()) as conn, conn:
+        removed = conn.execute("DELETE FROM sections WHERE name = ?", (section_name,)).rowcount
+    if removed == 0:
+        print(f"Section {section_name} is not registered.")
     else:
-        settings = {}
-    return settings
+        print(f"Section {section_name} removed.")
+    return
+
+def update_section(section_name, **fields):
+    """Update the stored fields of a section (e.g. last_mode, last_game_settings, checkpoint)."""
+    columns = ['last_mode', 'last_game_settings', 'checkpoint']
+    if any(field not in columns for field in fields):
+        raise ValueError(f"Invalid section fields, must be in {columns}.")
+    assignments = ', '.join(f'{field} = ?' for field in fields)
+    with closing(connect_settings()) as conn, conn:
+        conn.execute(f"UPDATE sections SET {assignments}, updated = ? WHERE name = ?",
+                     list(fields.values()) + [pd.Timestamp.now().isoformat(), section_name])
+    return
+
+def load_section_settings(term=None):
+    """Load the registered sections, optionally only those of a term.
+
+    Returns:
+        dict: Section name -> stored record (sheet_id, term, last_mode, last_game_settings, checkpoint).
+    """
+    with closing(connect_settings()) as conn:
+        if term is None:
+            rows = conn.execute("SELECT * FROM sections ORDER BY term, name").fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM sections WHERE term = ? ORDER BY name", (term,)).fetchall()
+    return {row['name']: dict(row) for row in rows}
+
+def list_sections(term=None):
+    """Print the registered sections."""
+    settings = load_section_settings(term)
+    if len(settings) == 0:
+        print("No sections registered.")
+        return
+    for section_name, record in settings.items():
+        term_label = f" [{record['term']}]" if record['term'] else ''
+        print(f"{section_name}{term_label}: {record['sheet_id']}")
+    return
 
 def prompt_for_section(settings):
-    """Prompt the user to select a section."""
+    """Prompt the user to select a section, by number or by name."""
     print("Select a section:")
-    for i, section_name in enumerate(settings.keys()):
-        print(f"{i + 1}. {section_name}")
+    section_names = list(settings.keys())
+    for i, section_name in enumerate(section_names):
+        term_label = f" [{settings[section_name]['term']}]" if settings[section_name]['term'] else ''
+        print(f"{i + 1}. {section_name}{term_label}")
     while True:
-        section_index = input("Enter the section number: ")
+        section_index = input("Enter the section number or name: ").strip()
+        if section_index in settings:
+            section_name = section_index
+            break
         try:
             section_index = int(section_index)
             if section_index < 1 or section_index > len(settings):
                 raise ValueError
+            section_name = section_names[section_index - 1]
             break
         except ValueError:
-            print("Invalid section number. Please enter a valid section number.")
-    section_index -= 1
-    section_name = list(settings.keys())[section_index]
-    section_sheet_id = settings[section_name]
+            print("Invalid section. Please enter a valid section number or name.")
     global_settings['section_name'] = section_name
-    global_settings['SPREADSHEET_ID'] = section_sheet_id
+    global_settings['SPREADSHEET_ID'] = settings[section_name]['sheet_id']
+    global_settings['section_record'] = settings[section_name]
     return 
 
 def load_students():
@@ -175,24 +498,21 @@ def load_students():
     service = global_settings['service']
     SPREADSHEET_ID = global_settings['SPREADSHEET_ID']
     sheet_name = 'Pricing'
-    result = service.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID,
-                                                 range=f'{sheet_name}!A2:B').execute()
-    values = result.get('values', [])
+    values = read_range_paged(sheet_name, 'A', 'B')
 
     if not values:
         raise ValueError('No data found in Pricing.')
     
-    # Make sure that that all other cells in the sheet are empty
-    service.spreadsheets().values().clear(
-        spreadsheetId=SPREADSHEET_ID, range=f'{sheet_name}!C2:Z1000', body={}
+    # Make sure that that all other cells in the sheet are empty, and that all of our other sheets
+    # are empty. Ranges are open ended so no stale rows of a larger section are left behind.
+    price_col = col_num_to_letters(N_ROUNDS + 2)
+    output_col = col_num_to_letters(N_ROUNDS + 3)
+    clear_ranges = [f'{sheet_name}!C2:{price_col}'] + \
+        [f'{_sheet_name}!A2:{output_col}' for _sheet_name in ['Rival Prices', 'Market Shares', 'Profits']] + \
+        ['GameResults!A1:Z']
+    service.spreadsheets().values().batchClear(
+        spreadsheetId=SPREADSHEET_ID, body={'ranges': clear_ranges}
     ).execute()
-    
-    # Make sure that all of our other sheets are empty
-    for _sheet_name in ['Rival Prices', 'Market Shares', 'Profits', 'GameResults']:
-        update_range = f'{_sheet_name}!A2:Z1000' if _sheet_name != 'GameResults' else f'{_sheet_name}!A1:Z1000'
-        service.spreadsheets().values().clear(
-            spreadsheetId=SPREADSHEET_ID, range=update_range, body={}
-        ).execute()
 
     # Create a DataFrame of students
     df_students = pd.DataFrame(values, columns=['Name', 'ID'])
@@ -204,10 +524,13 @@ def load_students():
     df_protected['Total Profit'] = 0
 
     # For each round, add columns for 'Rival Price', 'Market Share', 'Profit'
-    for round_num in range(1, 11):
+    for round_num in range(1, N_ROUNDS + 1):
         df_protected[f'Round{round_num}_RivalPrice'] = ''
         df_protected[f'Round{round_num}_MarketShare'] = ''
         df_protected[f'Round{round_num}_Profit'] = ''
+        # profits of the bot playing against the student, if any
+        df_protected[f'Round{round_num}_BotProfit'] = ''
+    df_protected['Bot Profit'] = 0
     
     df_protected.set_index('ID', inplace=True)    
     
@@ -226,7 +549,16 @@ def pair_students(student_list=None):
 
     pairs = []
     residual_student = None
+    bot_students = []
     df_protected = global_settings['df_protected']
+    bot = global_settings['bot']
+
+    # Students playing against a bot firm
+    if bot is not None and bot['opponents'] == 'all':
+        bot_students = student_list
+        student_list = []
+    elif bot is not None and len(student_list) % 2 == 1:
+        bot_students = [student_list.pop()]
 
     while len(student_list) >= 2:
         p1 = student_list.pop()
@@ -258,118 +590,528 @@ def pair_students(student_list=None):
             'Student1_Name': id_to_name.get(pair[0], ''),
             'Student2_ID': pair[1],
             'Student2_Name': id_to_name.get(pair[1], ''),
-            'Residual': residual
+            'Residual': residual,
+            'Bot': ''
+        })
+    for i, student_id in enumerate(bot_students):
+        df_protected.loc[student_id, 'student_round'] = 1
+        pair_data.append({
+            'Student1_ID': student_id,
+            'Student1_Name': id_to_name.get(student_id, ''),
+            'Student2_ID': f'bot_{i + 1}',
+            'Student2_Name': f"Bot ({bot['strategy']})",
+            'Residual': False,
+            'Bot': bot['strategy']
         })
-    df_pairs = pd.DataFrame(pair_data)
+    df_pairs = pd.DataFrame(pair_data, columns=['Student1_ID', 'Student1_Name', 'Student2_ID',
+                                                'Student2_Name', 'Residual', 'Bot'])
     global_settings['df_pairs'] = df_pairs
     global_settings['residual_student'] = residual_student
     return
 
-def plot_student_pairs():
-     
-    # Make a folder for the plots
-    if not os.path.exists('plots'):
-        os.makedirs('plots')
-    
-    # Make a subfolder for the section
-    section_name = global_settings['section_name']
-    if not os.path.exists(f'plots/{section_name}'):
-        os.makedirs(f'plots/{section_name}')
-    game_abbrev = global_settings['game_abbrev']
-    today = global_settings['today']
-    fig_dir = f'plots/{section_name}/{game_abbrev}_{today}'
-    if not os.path.exists(fig_dir):
-        os.makedirs(fig_dir)
-        
-    
-    # get the data sets
-    df_pairs = global_settings['df_pairs'].copy()
-    df_prices = get_prices()
-    df_protected = global_settings['df_protected']
-    mode = global_settings['mode']
-    
-    df_pairs['total_profit'] = df_pairs['Student1_ID'].map(df_protected['Total Profit']) + \
-        df_pairs['Student2_ID'].map(df_protected['Total Profit'])
-    df_pairs.sort_values('total_profit', ascending=False, inplace=True)
-    df_pairs.reset_index(drop=True, inplace=True)
+def price_grid_bounds():
+    """Get the price range of the bots: around the NE and Monopoly prices of the current game."""
+    benchmarks = global_settings['extra_price_plot_lines']
+    if 'NE' not in benchmarks or 'Monopoly' not in benchmarks:
+        benchmarks = {**numeric_benchmarks(global_settings['mode'], global_settings['game_settings']), **benchmarks}
+    ne = benchmarks.get('NE', global_settings['game_settings']['c'])
+    monopoly = benchmarks['Monopoly']
+    spread = 0.1 * abs(monopoly - ne)
+    return max(min(ne, monopoly) - spread, 0.0), max(ne, monopoly) + spread, ne
 
-    # Generate line plots
-    rounds = list(range(1, 11))
-    for index, pair in df_pairs.iterrows():
-        s1_id = pair['Student1_ID']
-        s2_id = pair['Student2_ID']
-        s1_name = pair['Student1_Name']
-        s2_name = pair['Student2_Name']
-
-        # Get prices and profits for s1
-        s1_prices = []
-        s1_profits = []
-        for r in rounds:
-            price_col_name = f'Price_{r}'
-            price = df_prices.loc[df_prices['ID'] == s1_id, price_col_name].values
-            if len(price) == 0 or pd.isna(price[0]):
-                continue
-            s1_prices.append(price[0])
-            profit = pd.to_numeric(df_protected.loc[s1_id, f'Round{r}_Profit'], errors='coerce')
-            s1_profits.append(profit)
-
-        # Get prices and profits for s2
-        s2_prices = []
-        s2_profits = []
-        for r in rounds:
-            price_col_name = f'Price_{r}'
-            price = df_prices.loc[df_prices['ID'] == s2_id, price_col_name].values
-            if len(price) == 0 or pd.isna(price[0]):
-                continue
-            s2_prices.append(price[0])
-            profit = pd.to_numeric(df_protected.loc[s2_id, f'Round{r}_Profit'], errors='coerce')
-            s2_profits.append(profit)
+def train_q_learning_policy(profits, n_sessions=64, n_steps=20000, alpha=0.15, gamma=0.95, seed=0):
+    """Train Q-learning pricing agents against each other, batched over independent sessions.
 
-        s1_name_short = s1_name.split()[0]
-        s2_name_short = s2_name.split()[0]
-        
-        # Plot prices and profits side by sides
-        fig, axs = plt.subplots(1, 2, figsize=(15, 5))
-        axs[0].plot(range(1, 1 + len(s1_prices)), s1_prices, label=f'{s1_name_short}', linestyle='solid')
-        axs[0].plot(range(1, 1 + len(s2_prices)), s2_prices, label=f'{s2_name_short}', linestyle='dashed')
-        axs[0].set_xlabel('Round')
-        axs[0].set_ylabel('Price')
-        axs[0].set_title(f'Prices for {s1_name} and {s2_name}')
-        axs[0].legend()
-        
-        axs[1].plot(range(1, 1+ len(s1_profits)), s1_profits, label=f'{s1_name_short}', linestyle='solid')
-        axs[1].plot(range(1, 1 + len(s2_profits)), s2_profits, label=f'{s2_name_short}', linestyle='dashed')
-        axs[1].set_xlabel('Round')
-        axs[1].set_ylabel('Profit')
-        axs[1].set_title(f'Profits for {s1_name} and {s2_name}')
-        axs[1].legend()
-        plt.tight_layout()
-        s1_name_clean = s1_name.replace(' ', '_').lower()
-        s2_name_clean = s2_name.replace(' ', '_').lower()
-        plt.savefig(os.path.join(fig_dir, f'rank_{index+1:d}_{s1_name_clean}_{s2_name_clean}.png'))
-        plt.close('all')
-    
-    # Add a plot of the average price per round
+    Each agent's state is the pair of (own, rival) prices of the previous round. Exploration decays
+    exponentially from 1 to 0.01 over the training.
+
+    Args:
+        profits (np.ndarray): profits[a1, a2] of a firm playing price a1 against a rival playing a2.
+        n_sessions (int, optional): Number of sessions trained at once. Defaults to 64.
+        n_steps (int, optional): Number of rounds per session. Defaults to 20000.
+        alpha (float, optional): Learning rate. Defaults to 0.15.
+        gamma (float, optional): Discount factor. Defaults to 0.95.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        np.ndarray: The greedy action per state (own * n_actions + rival), by majority across sessions.
+    """
+    rng = np.random.default_rng(seed)
+    n_actions = profits.shape[0]
+    n_states = n_actions * n_actions
+    sessions = np.arange(n_sessions)
+    # start from the discounted payoff against a uniformly random rival
+    q_init = profits.mean(axis=1) / (1 - gamma)
+    Q = np.broadcast_to(q_init, (2, n_sessions, n_states, n_actions)).copy()
+    a1 = rng.integers(0, n_actions, n_sessions)
+    a2 = rng.integers(0, n_actions, n_sessions)
+    beta = np.log(100) / n_steps
+    for t in range(n_steps):
+        s1 = a1 * n_actions + a2
+        s2 = a2 * n_actions + a1
+        explore = rng.random((2, n_sessions)) < np.exp(-beta * t)
+        random_actions = rng.integers(0, n_actions, (2, n_sessions))
+        a1 = np.where(explore[0], random_actions[0], Q[0, sessions, s1].argmax(axis=1))
+        a2 = np.where(explore[1], random_actions[1], Q[1, sessions, s2].argmax(axis=1))
+        next_s1 = a1 * n_actions + a2
+        next_s2 = a2 * n_actions + a1
+        Q[0, sessions, s1, a1] += alpha * (profits[a1, a2] + gamma * Q[0, sessions, next_s1].max(axis=1) - Q[0, sessions, s1, a1])
+        Q[1, sessions, s2, a2] += alpha * (profits[a2, a1] + gamma * Q[1, sessions, next_s2].max(axis=1) - Q[1, sessions, s2, a2])
+    greedy = Q.argmax(axis=3).reshape(-1, n_states)
+    votes = np.zeros((n_states, n_actions))
+    np.add.at(votes, (np.tile(np.arange(n_states), greedy.shape[0]), greedy.ravel()), 1)
+    return votes.argmax(axis=1)
+
+def load_q_learning_policy(grid, n_sessions=64, n_steps=20000, alpha=0.15, gamma=0.95):
+    """Load the Q-learning policy of the current game settings from disk, training it if needed."""
+    settings_key = repr((global_settings['mode'], sorted(global_settings['game_settings'].items()),
+                         grid.round(6).tolist(), n_sessions, n_steps, alpha, gamma))
+    digest = hashlib.sha1(settings_key.encode('utf-8')).hexdigest()[:16]
+    policy_file = os.path.join('bots', f"{global_settings['mode']}_{digest}.npy")
+    if os.path.exists(policy_file):
+        return np.load(policy_file)
+    print("Training the Q-learning bot on the current demand model...")
+    p1, p2 = np.meshgrid(grid, grid, indexing='ij')
+    (_, profits), _ = demand_and_profits_array(p1.ravel(), p2.ravel())
+    policy = train_q_learning_policy(profits.reshape(p1.shape), n_sessions, n_steps, alpha, gamma)
+    if not os.path.exists('bots'):
+        os.makedirs('bots')
+    np.save(policy_file, policy)
+    return policy
+
+def make_bot(strategy, opponents, fixed_price=None, n_actions=15):
+    """Set up a bot firm for the current game.
+
+    All strategies are turned into a lookup table of the bot's price given the discretized
+    (own, rival) prices of the previous round, so that a bot's move is a single lookup.
+
+    Args:
+        strategy (str): 'fixed', 'best response' or 'q-learning'.
+        opponents (str): 'residual' to only play against the residual student, or 'all'.
+        fixed_price (float, optional): The price of the fixed strategy. Defaults to the NE.
+        n_actions (int, optional): Number of prices of the q-learning bot. Defaults to 15.
+    """
+    low, high, ne = price_grid_bounds()
+    if strategy == 'fixed':
+        price = ne if fixed_price is None else fixed_price
+        grid = np.array([price], dtype=float)
+        policy = np.full((1, 1), price)
+        first_price = price
+    elif strategy == 'best response':
+        # best reply to the student's last price, found on a fine grid of replies
+        grid = np.linspace(low, high, 401)
+        p1, p2 = np.meshgrid(grid, grid, indexing='ij')
+        (_, profits), _ = demand_and_profits_array(p1.ravel(), p2.ravel())
+        best_response = grid[profits.reshape(p1.shape).argmax(axis=0)]
+        policy = np.broadcast_to(best_response, (len(grid), len(grid))).copy()
+        first_price = best_response[np.abs(grid - ne).argmin()]
+    elif strategy == 'q-learning':
+        grid = np.linspace(low, high, n_actions)
+        actions = load_q_learning_policy(grid)
+        policy = grid[actions].reshape(n_actions, n_actions)
+        start = np.abs(grid - ne).argmin()
+        first_price = policy[start, start]
+    else:
+        raise ValueError("Invalid bot strategy.")
+    global_settings['bot'] = {
+        'strategy': strategy,
+        'opponents': opponents,
+        'grid': grid,
+        'policy': policy,
+        'first_price': float(first_price)
+    }
+    return
+
+def bot_price(student_id, round_num, df_prices, df_protected):
+    """Get the price of the bot playing against a student in a given round."""
+    bot = global_settings['bot']
+    if round_num <= 1:
+        return bot['first_price']
+    # the bot's last price is the student's last rival price
+    own_price = pd.to_numeric(df_protected.loc[student_id, f'Round{round_num - 1}_RivalPrice'], errors='coerce')
+    rival_price = df_prices.loc[df_prices['ID'] == student_id, f'Price_{round_num - 1}'].values
+    if pd.isna(own_price) or len(rival_price) == 0 or pd.isna(rival_price[0]):
+        return bot['first_price']
+    grid = bot['grid']
+    own_state = np.abs(grid - own_price).argmin()
+    rival_state = np.abs(grid - rival_price[0]).argmin()
+    return float(bot['policy'][own_state, rival_state])
+
+def prompt_for_bot():
+    """Prompt the user for whether and how students play against bot firms."""
+    opponents = clean_input("Play against pricing bots?\n"
+                            "(a) No\n"
+                            "(b) Only the residual student (odd class size)\n"
+                            "(c) All students\n")
+    if opponents not in ['a', 'b', 'c']:
+        print("Invalid option selected.")
+        raise ValueError("Invalid option selected.")
+    if opponents == 'a':
+        global_settings['bot'] = None
+        return
+    strategy = clean_input("Select the bot strategy:\n"
+                           "(a) Fixed price\n"
+                           "(b) Best response to the last price\n"
+                           "(c) Q-learning (trained on the current demand model)\n")
+    strategy_map = {
+        'a': 'fixed',
+        'b': 'best response',
+        'c': 'q-learning'
+    }
+    if strategy not in strategy_map:
+        print("Invalid strategy selected.")
+        raise ValueError("Invalid strategy selected.")
+    fixed_price = None
+    if strategy == 'a':
+        fixed_price = input_number("Choose the bot's price (or press Enter for the NE price): ", None)
+    make_bot(strategy_map[strategy], 'residual' if opponents == 'b' else 'all', fixed_price)
+    return
+
+def get_student_series(student_id, df_prices, df_protected, rounds):
+    """Collect the submitted prices and resulting profits of a student for the given rounds."""
+    prices = []
+    profits = []
+    for r in rounds:
+        price_col_name = f'Price_{r}'
+        price = df_prices.loc[df_prices['ID'] == student_id, price_col_name].values
+        if len(price) == 0 or pd.isna(price[0]):
+            continue
+        prices.append(price[0])
+        profit = pd.to_numeric(df_protected.loc[student_id, f'Round{r}_Profit'], errors='coerce')
+        profits.append(profit)
+    return prices, profits
+
+def get_bot_series(student_id, df_prices, df_protected, rounds):
+    """Collect the prices and profits of the bot playing against a student for the given rounds.
+
+    Bots are not in the Pricing sheet: their prices are the student's rival prices, and their
+    profits are kept with the student's round results.
+    """
+    prices = []
+    profits = []
+    for r in rounds:
+        price = pd.to_numeric(df_protected.loc[student_id, f'Round{r}_RivalPrice'], errors='coerce')
+        if pd.isna(price):
+            continue
+        prices.append(price)
+        profits.append(pd.to_numeric(df_protected.loc[student_id, f'Round{r}_BotProfit'], errors='coerce'))
+    return prices, profits
+
+def make_pair_figure(pair, df_prices, df_protected) -> Figure:
+    """Build the side-by-side price and profit figure of a pair of students."""
+    rounds = list(range(1, N_ROUNDS + 1))
+    s1_name = pair['Student1_Name']
+    s2_name = pair['Student2_Name']
+    s1_prices, s1_profits = get_student_series(pair['Student1_ID'], df_prices, df_protected, rounds)
+    if pair['Bot'] != '':
+        s2_prices, s2_profits = get_bot_series(pair['Student1_ID'], df_prices, df_protected, rounds)
+    else:
+        s2_prices, s2_profits = get_student_series(pair['Student2_ID'], df_prices, df_protected, rounds)
+
+    s1_name_short = s1_name.split()[0]
+    s2_name_short = s2_name.split()[0]
+    
+    # Plot prices and profits side by sides
+    fig = Figure(figsize=(15, 5))
+    axs = fig.subplots(1, 2)
+    axs[0].plot(range(1, 1 + len(s1_prices)), s1_prices, label=f'{s1_name_short}', linestyle='solid')
+    axs[0].plot(range(1, 1 + len(s2_prices)), s2_prices, label=f'{s2_name_short}', linestyle='dashed')
+    axs[0].set_xlabel('Round')
+    axs[0].set_ylabel('Price')
+    axs[0].set_title(f'Prices for {s1_name} and {s2_name}')
+    axs[0].legend()
+    
+    axs[1].plot(range(1, 1+ len(s1_profits)), s1_profits, label=f'{s1_name_short}', linestyle='solid')
+    axs[1].plot(range(1, 1 + len(s2_profits)), s2_profits, label=f'{s2_name_short}', linestyle='dashed')
+    axs[1].set_xlabel('Round')
+    axs[1].set_ylabel('Profit')
+    axs[1].set_title(f'Profits for {s1_name} and {s2_name}')
+    axs[1].legend()
+    fig.tight_layout()
+    return fig
+
+def make_average_price_figure(df_prices) -> Figure:
+    """Build the average price per round figure with the benchmark price lines."""
+    rounds = list(range(1, N_ROUNDS + 1))
     avg_prices = []
     for r in rounds:
         prices = df_prices[f'Price_{r}']
         avg_price = prices.mean()
         avg_prices.append(avg_price)
-    plt.figure(figsize=(10, 5))
-    plt.plot(rounds, avg_prices, label='Average Price', linestyle='solid', linewidth=2)
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(rounds, avg_prices, label='Average Price', linestyle='solid', linewidth=2)
+    extra_plots = global_settings['extra_price_plot_lines']
+    palette = {
+        'NE': 'red',
+        'Monopoly': 'green'
+    }
+    for label, price in extra_plots.items():
+        ax.axhline(y=price, linestyle='--', label=label, color=palette.get(label, 'black'))
+    ax.set_xlabel('Round')
+    ax.set_ylabel('Price')
+    ax.set_title('Average Price per Round')
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+def get_student2_total_profit(df_pairs, df_protected) -> pd.Series:
+    """Get the total profit of the second firm of every pair, bots included."""
+    # bots are not students, their profits are kept with the student they play against
+    bot_profit = df_pairs['Student1_ID'].map(df_protected['Bot Profit'])
+    return df_pairs['Student2_ID'].map(df_protected['Total Profit']).where(df_pairs['Bot'] == '', bot_profit)
+
+def rank_pairs(df_pairs, df_protected):
+    """Return a copy of the pairs sorted by their joint total profit."""
+    df_pairs = df_pairs.copy()
+    df_pairs['total_profit'] = df_pairs['Student1_ID'].map(df_protected['Total Profit']) + \
+        get_student2_total_profit(df_pairs, df_protected)
+    df_pairs.sort_values('total_profit', ascending=False, inplace=True)
+    return df_pairs
+
+def get_pair_price_array(df_prices, df_pairs, df_protected) -> np.ndarray:
+    """Gather the prices of every pair into a single (pairs, 2, rounds) array, NaN where missing.
+
+    The prices of a bot are taken from the rival prices of the student it plays against.
+    """
+    price_cols = [f'Price_{r}' for r in range(1, N_ROUNDS + 1)]
+    rival_cols = [f'Round{r}_RivalPrice' for r in range(1, N_ROUNDS + 1)]
+    prices = df_prices.drop_duplicates('ID').set_index('ID')[price_cols]
+    s1_prices = prices.reindex(df_pairs['Student1_ID']).to_numpy(dtype=float)
+    s2_prices = prices.reindex(df_pairs['Student2_ID']).to_numpy(dtype=float)
+    is_bot = (df_pairs['Bot'] != '').to_numpy()
+    if is_bot.any():
+        bot_rivals = df_pairs.loc[is_bot, 'Student1_ID']
+        s2_prices[is_bot] = df_protected.loc[bot_rivals, rival_cols].apply(
+            pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    return np.stack([s1_prices, s2_prices], axis=1)
+
+def save_class_figures(df_prices, df_pairs, df_protected, fig_dir):
+    """Save the class-wide overlay, density heatmap and small-multiples figures.
+
+    All three figures are drawn from one price array with collection-based draw calls, so that
+    the cost barely grows with the number of pairs.
+    """
+    df_pairs = rank_pairs(df_pairs, df_protected)
+    pair_prices = get_pair_price_array(df_prices, df_pairs, df_protected)
+    n_pairs, _, n_rounds = pair_prices.shape
+    rounds = np.arange(1, n_rounds + 1, dtype=float)
     extra_plots = global_settings['extra_price_plot_lines']
     palette = {
         'NE': 'red',
         'Monopoly': 'green'
     }
+    student_prices = pair_prices.reshape(-1, n_rounds)
+    valid = ~np.isnan(student_prices)
+    max_price = max([np.nanmax(student_prices) if valid.any() else 1.0] + list(extra_plots.values()))
+    max_price = max(max_price, 1.0) * 1.05
+
+    # Overlay of every price path in one collection
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    segments = np.stack([np.broadcast_to(rounds, student_prices.shape), student_prices], axis=-1)
+    ax.add_collection(LineCollection(segments, colors='tab:blue', alpha=min(1.0, 10.0 / len(segments)), linewidths=1))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        ax.plot(rounds, np.nanmean(student_prices, axis=0), color='black', linewidth=2, label='Average Price')
     for label, price in extra_plots.items():
-        plt.axhline(y=price, linestyle='--', label=label, color=palette.get(label, 'black'))
-    plt.xlabel('Round')
-    plt.ylabel('Price')
-    plt.title('Average Price per Round')
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(fig_dir, 'average_prices.png'))
+        ax.axhline(y=price, linestyle='--', label=label, color=palette.get(label, 'black'))
+    ax.set_xlim(1, n_rounds)
+    ax.set_ylim(0, max_price)
+    ax.set_xlabel('Round')
+    ax.set_ylabel('Price')
+    ax.set_title(f'Price paths of all {len(segments)} students')
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(os.path.join(fig_dir, 'class_price_paths.png'))
+
+    # Round x price density, as the share of students in each price bin per round
+    price_bins = np.linspace(0, max_price, 41)
+    round_idx = np.broadcast_to(np.arange(n_rounds), student_prices.shape)[valid]
+    counts, _, _ = np.histogram2d(round_idx, student_prices[valid], bins=[np.arange(n_rounds + 1), price_bins])
+    shares = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    mesh = ax.pcolormesh(np.arange(n_rounds + 1) + 0.5, price_bins, shares.T, cmap='viridis', shading='flat')
+    fig.colorbar(mesh, ax=ax, label='Share of students')
+    for label, price in extra_plots.items():
+        ax.axhline(y=price, linestyle='--', label=label, color=palette.get(label, 'white'))
+    ax.set_xlabel('Round')
+    ax.set_ylabel('Price')
+    ax.set_title('Price density per round')
+    if extra_plots:
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(os.path.join(fig_dir, 'class_price_density.png'))
+
+    # Small multiples, one cell per pair sorted by total pair profit, drawn as a single collection
+    n_cols = max(int(np.ceil(np.sqrt(n_pairs))), 1)
+    n_rows = max(int(np.ceil(n_pairs / n_cols)), 1)
+    cell = np.arange(n_pairs)
+    x_offset = (cell % n_cols).astype(float)
+    y_offset = (n_rows - 1 - cell // n_cols).astype(float)
+    x_local = 0.05 + 0.9 * (rounds - 1) / max(n_rounds - 1, 1)
+    y_local = 0.05 + 0.9 * pair_prices / max_price
+    xs = np.broadcast_to(x_offset[:, None, None] + x_local, pair_prices.shape)
+    ys = y_offset[:, None, None] + y_local
+    segments = np.stack([xs, ys], axis=-1).reshape(-1, n_rounds, 2)
+    colors = np.tile(['tab:blue', 'tab:orange'], n_pairs)
+    fig = Figure(figsize=(2 * n_cols, 1.5 * n_rows))
+    ax = fig.subplots()
+    for label, price in extra_plots.items():
+        level = y_offset + 0.05 + 0.9 * price / max_price
+        ax.hlines(level, x_offset + 0.05, x_offset + 0.95, colors=palette.get(label, 'black'),
+                  linestyles='dashed', linewidths=0.5, label=label)
+    ax.add_collection(LineCollection(segments, colors=colors, linewidths=1))
+    ax.vlines(np.arange(n_cols + 1), 0, n_rows, colors='lightgrey', linewidths=0.5)
+    ax.hlines(np.arange(n_rows + 1), 0, n_cols, colors='lightgrey', linewidths=0.5)
+    ax.set_xlim(0, n_cols)
+    ax.set_ylim(0, n_rows)
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_title('Pair price paths, ranked by total pair profit (left to right, top to bottom)')
+    if extra_plots:
+        ax.legend(loc='upper right', bbox_to_anchor=(1.0, 1.0 + 0.5 / n_rows))
+    fig.tight_layout()
+    fig.savefig(os.path.join(fig_dir, 'class_small_multiples.png'))
+    return fig_dir
+
+def get_fig_dir():
+    """Get (and create if needed) the plot folder of the current section and game."""
+    section_name = global_settings['section_name']
+    game_abbrev = global_settings['game_abbrev']
+    today = global_settings['today']
+    fig_dir = f'plots/{section_name}/{game_abbrev}_{today}'
+    if not os.path.exists(fig_dir):
+        os.makedirs(fig_dir)
+    return fig_dir
+
+def save_figure(make_figure, args, path):
+    """Build a figure and save it to disk (runs on the background plotting thread or a plot worker)."""
+    fig = make_figure(*args)
+    fig.savefig(path)
+    return path
+
+def get_plot_signatures(df_prices, df_pairs, df_protected) -> dict:
+    """Hash, per chart, everything that it shows, so that a chart is redrawn only when its data changed.
+
+    Returns:
+        dict: Signatures keyed by ('pair', index) for the pair charts, 'average_prices' and 'class'.
+    """
+    # Hash, per student, everything that their charts show (bot prices are their rival prices)
+    price_cols = [f'Price_{r}' for r in range(1, N_ROUNDS + 1)]
+    profit_cols = [f'Round{r}_Profit' for r in range(1, N_ROUNDS + 1)]
+    rival_cols = [f'Round{r}_RivalPrice' for r in range(1, N_ROUNDS + 1)]
+    df_plotted = df_prices.drop_duplicates('ID').set_index('ID')[price_cols].reindex(df_protected.index)
+    df_plotted = pd.concat([df_plotted, df_protected[profit_cols + rival_cols]], axis=1).astype(str)
+    student_hashes = pd.util.hash_pandas_object(df_plotted, index=True)
+    s1_hashes = df_pairs['Student1_ID'].map(student_hashes).to_numpy()
+    s2_hashes = df_pairs['Student2_ID'].map(student_hashes).to_numpy()
+    signatures = {('pair', index): (s1_hash, s2_hash)
+                  for index, s1_hash, s2_hash in zip(df_pairs.index, s1_hashes, s2_hashes)}
+    signatures['average_prices'] = pd.util.hash_pandas_object(df_prices[price_cols].astype(str), index=False).sum()
+    signatures['class'] = student_hashes.sum()
+    return signatures
+
+def update_plots(df_prices):
+    """Refresh in the background the figures of the pairs whose data changed since the last update.
+
+    Pair figures are kept under a stable name in the 'pairs' subfolder of the game's plot folder
+    and the average price figure is rewritten in place, so that by the end of the game every
+    figure is already on disk. Depending on ``global_settings['plot_mode']`` ('pairs', 'class',
+    'both' or 'none') the per-pair figures, the class-wide figures, both, or none are kept up to date.
+
+    Args:
+        df_prices (pd.DataFrame): The latest prices, as returned by get_prices.
+    """
+    df_pairs = global_settings['df_pairs']
+    if df_pairs is None or df_pairs.empty or df_prices is None or global_settings['plot_mode'] == 'none':
+        return
+    state = global_settings['plot_state']
+    if state is None:
+        state = {
+            'signatures': {},
+            'futures': {},
+            'executor': ThreadPoolExecutor(max_workers=1),
+            # pair figures are spread over processes, every pair changes in every round.
+            # Workers are spawned, not forked, as the dashboard and plotting threads may be drawing.
+            'pair_executor': ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        }
+        global_settings['plot_state'] = state
+    df_protected = global_settings['df_protected']
+    plot_mode = global_settings['plot_mode']
+    fig_dir = get_fig_dir()
+    pair_dir = os.path.join(fig_dir, 'pairs')
+    if plot_mode in ['pairs', 'both'] and not os.path.exists(pair_dir):
+        os.makedirs(pair_dir)
+
+    new_signatures = get_plot_signatures(df_prices, df_pairs, df_protected)
+    signatures = state['signatures']
+
+    def submit(key, make_figure, args, path, executor=state['executor']):
+        # a queued render of an older version of this figure is no longer needed
+        previous = state['futures'].get(key)
+        if previous is not None:
+            previous.cancel()
+        state['futures'][key] = executor.submit(save_figure, make_figure, args, path)
+
+    for index, pair in df_pairs.iterrows():
+        if plot_mode not in ['pairs', 'both']:
+            break
+        key = ('pair', index)
+        if signatures.get(key) == new_signatures[key]:
+            continue
+        signatures[key] = new_signatures[key]
+        path = os.path.join(pair_dir, f'pair_{index}.png')
+        # only send the worker the rows of the pair
+        pair_ids = [pair['Student1_ID'], pair['Student2_ID']]
+        df_pair_prices = df_prices[df_prices['ID'].isin(pair_ids)]
+        df_pair_protected = df_protected[df_protected.index.isin(pair_ids)]
+        submit(key, make_pair_figure, (pair, df_pair_prices, df_pair_protected), path,
+               executor=state['pair_executor'])
+
+    if signatures.get('average_prices') != new_signatures['average_prices']:
+        signatures['average_prices'] = new_signatures['average_prices']
+        path = os.path.join(fig_dir, 'average_prices.png')
+        submit('average_prices', make_average_price_figure, (df_prices,), path)
+
+    if plot_mode in ['class', 'both'] and signatures.get('class') != new_signatures['class']:
+        signatures['class'] = new_signatures['class']
+        # the class figures are saved directly by save_class_figures
+        previous = state['futures'].get('class')
+        if previous is not None:
+            previous.cancel()
+        state['futures']['class'] = state['executor'].submit(
+            save_class_figures, df_prices, df_pairs, df_protected, fig_dir)
+    return
+
+def plot_student_pairs():
+    """Finalize the plots: bring the figures up to date and name the pair figures by rank."""
+    if global_settings['plot_mode'] == 'none':
+        return
+    fig_dir = get_fig_dir()
+    
+    # get the data sets, only pairs whose data changed since the last round are re-drawn
+    df_prices = get_prices()
+    update_plots(df_prices)
+    state = global_settings['plot_state']
+    if state is None:
+        return
+    for future in state['futures'].values():
+        if not future.cancelled():
+            future.result()
+    
+    if global_settings['plot_mode'] not in ['pairs', 'both']:
+        return
+    df_protected = global_settings['df_protected']
+    df_pairs = rank_pairs(global_settings['df_pairs'], df_protected)
+
+    # Copy the pair figures to their ranked names
+    for rank, (index, pair) in enumerate(df_pairs.iterrows(), start=1):
+        s1_name_clean = pair['Student1_Name'].replace(' ', '_').lower()
+        s2_name_clean = pair['Student2_Name'].replace(' ', '_').lower()
+        shutil.copyfile(os.path.join(fig_dir, 'pairs', f'pair_{index}.png'),
+                        os.path.join(fig_dir, f'rank_{rank:d}_{s1_name_clean}_{s2_name_clean}.png'))
     return
         
 
@@ -410,9 +1152,8 @@ def prepare_update_request(sheet_name: str, data: pd.DataFrame) -> dict:
     # Make sure that 'Name' and 'ID' are the first columns
     data = data[['Name', 'ID'] + [col for col in data.columns if col not in ['Name', 'ID']]].copy()
     
+    # Data is converted to serializable formats page by page in execute_batch_update
     export_data = data.values.tolist()
-    # Convert data types to serializable formats
-    export_data = convert_to_serializable(export_data)
 
     # Determine the column letter
     col_letter = col_num_to_letters(data.shape[1])
@@ -428,40 +1169,206 @@ def prepare_update_request(sheet_name: str, data: pd.DataFrame) -> dict:
     }
     return request
 
+def col_letters_to_num(letters):
+    """Convert a column letter to its corresponding positive integer."""
+    n = 0
+    for c in letters:
+        n = n * 26 + ord(c) - 64
+    return n
+
+def split_update_request(request, page_rows=None):
+    """Split an update request into requests of at most page_rows rows each."""
+    page_rows = PAGE_ROWS if page_rows is None else page_rows
+    sheet_name, cells = request['range'].rsplit('!', 1)
+    start_col, start_row = re.match(r'([A-Z]+)(\d+)', cells).groups()
+    start_row = int(start_row)
+    values = request['values']
+    for i in range(0, len(values), page_rows):
+        page = values[i:i + page_rows]
+        n_cols = max((len(row) for row in page), default=1)
+        end_col = col_num_to_letters(col_letters_to_num(start_col) + max(n_cols, 1) - 1)
+        yield {
+            'range': f'{sheet_name}!{start_col}{start_row + i}:{end_col}{start_row + i + len(page) - 1}',
+            'values': page
+        }
+
 def execute_batch_update(update_requests):
     """Execute a batch update with the collected update requests.
 
+    Large requests are split into pages, grouped into batch updates of at most PAGE_CELLS cells.
+    Each batch is sent by a background writer while the next one is prepared.
+
     Args:
         update_requests (list): A list of update request dictionaries.
     """
     service = global_settings['service']
     SPREADSHEET_ID = global_settings['SPREADSHEET_ID']
 
-    body = {
-        'valueInputOption': 'RAW',
-        'data': update_requests
-    }
-    service.spreadsheets().values().batchUpdate(
-        spreadsheetId=SPREADSHEET_ID,
-        body=body
-    ).execute()
+    def send(data):
+        body = {
+            'valueInputOption': 'RAW',
+            'data': data
+        }
+        service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body=body
+        ).execute()
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        sent = []
+        batch = []
+        batch_cells = 0
+        for request in update_requests:
+            for page in split_update_request(request):
+                # Convert data types to serializable formats
+                page['values'] = convert_to_serializable(page['values'])
+                page_cells = sum(len(row) for row in page['values'])
+                if batch and batch_cells + page_cells > PAGE_CELLS:
+                    sent.append(writer.submit(send, batch))
+                    batch, batch_cells = [], 0
+                batch.append(page)
+                batch_cells += page_cells
+        if batch:
+            sent.append(writer.submit(send, batch))
+        for future in sent:
+            future.result()
+    return
+
+def read_range_paged(sheet_name, first_col, last_col, start_row=2, n_rows=None, page_rows=None):
+    """Read the rows of a sheet in pages of bounded size, fetching the next page in the background.
+
+    Args:
+        sheet_name (str): The name of the sheet to read.
+        first_col (str): The first column letter.
+        last_col (str): The last column letter.
+        start_row (int, optional): The first row to read. Defaults to 2.
+        n_rows (int, optional): Number of rows to read. If None, reads until a page comes back empty.
+        page_rows (int, optional): Rows per request. Defaults to PAGE_ROWS.
+
+    Returns:
+        list: The rows read, as lists of cell values.
+    """
+    service = global_settings['service']
+    SPREADSHEET_ID = global_settings['SPREADSHEET_ID']
+    page_rows = PAGE_ROWS if page_rows is None else page_rows
+    end_row = None if n_rows is None else start_row + n_rows - 1
+
+    def fetch(first_row):
+        last_row = first_row + page_rows - 1 if end_row is None else min(first_row + page_rows - 1, end_row)
+        result = service.spreadsheets().values().get(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f'{sheet_name}!{first_col}{first_row}:{last_col}{last_row}'
+        ).execute()
+        return result.get('values', []), last_row - first_row + 1
+
+    values = []
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        first_row = start_row
+        future = reader.submit(fetch, first_row)
+        while future is not None:
+            page, expected_rows = future.result()
+            first_row += page_rows
+            # the API drops trailing blank rows, so a short page is not necessarily the last one
+            has_more = first_row <= end_row if end_row is not None else len(page) > 0
+            future = reader.submit(fetch, first_row) if has_more else None
+            if has_more:
+                # trailing empty rows are not returned by the API, keep the rows aligned
+                page = page + [[] for _ in range(expected_rows - len(page))]
+            values.extend(page)
+    if end_row is None:
+        # drop the padding of the last non-empty page
+        while values and not values[-1]:
+            values.pop()
+    return values
+
+def sanitize_prices(df_raw: pd.DataFrame) -> tuple:
+    """Parse a block of raw price inputs into numeric prices in a single vectorized pass.
+
+    Student inputs such as "$45", "45,5", " 30 ", "1 234" or "50 USD" are normalized by
+    stripping a leading or trailing currency symbol or code and whitespace and by resolving
+    thousands and decimal separators. Any other text left in the cell makes it unparseable.
+    Cells that cannot be parsed, or that fall outside ``global_settings['price_bounds']``,
+    are set to NaN and flagged in the returned issues frame.
+
+    Args:
+        df_raw (pd.DataFrame): A dataframe with the raw (string) price inputs, one column per round.
+
+    Returns:
+        tuple: The numeric price dataframe (same shape as the input) and a dataframe of
+            issues with columns 'row', 'Round', 'Raw', and 'Issue'.
+    """
+    n_rows, n_cols = df_raw.shape
+    raw = pd.Series(df_raw.to_numpy(dtype=object).ravel(), dtype='string')
+    text = raw.str.strip()
+    submitted = (text.notna() & (text != '')).fillna(False).astype(bool)
+    
+    # Drop a leading or trailing currency symbol or code, and spaces grouping digits in thousands
+    text = text.str.replace(CURRENCY_PREFIX, '', regex=True).str.replace(CURRENCY_SUFFIX, '', regex=True)
+    text = text.str.replace(r'(?<=\d)\s(?=\d{3}(?:\D|$))', '', regex=True)
+    # anything else than digits and separators is not a price we can guess
+    text = text.where(text.str.fullmatch(r'-?[0-9.,]+').fillna(False).astype(bool))
+    
+    # Resolve separators: a comma is the decimal mark if it is the last separator and
+    # it is not grouping digits in thousands (e.g. "45,5" or "1.234,5" but not "1,234")
+    last_comma = text.str.rfind(',')
+    last_dot = text.str.rfind('.')
+    comma_thousands = text.str.fullmatch(r'-?\d{1,3}(,\d{3})+').fillna(False).astype(bool)
+    comma_decimal = ((last_comma > last_dot) & ~comma_thousands).fillna(False).astype(bool)
+    dot_thousands = (~comma_decimal & (text.str.count(r'\.') > 1)).fillna(False).astype(bool)
+    
+    text = text.mask(comma_decimal, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    text = text.mask(~comma_decimal, text.str.replace(',', '', regex=False))
+    text = text.mask(dot_thousands, text.str.replace('.', '', regex=False))
+    prices = pd.to_numeric(text.astype(object), errors='coerce').astype(float)
+    
+    # Flag inputs we could not use instead of silently dropping them
+    low, high = global_settings['price_bounds']
+    unparseable = submitted & prices.isna()
+    out_of_range = prices.notna() & ((prices < low) | (prices > high))
+    prices = prices.mask(out_of_range)
+    
+    flat_index = np.arange(n_rows * n_cols)
+    issues = pd.DataFrame({
+        'row': flat_index // n_cols,
+        'Round': flat_index % n_cols + 1,
+        'Raw': raw.to_numpy(dtype=object),
+        'Issue': np.where(unparseable, 'unparseable', np.where(out_of_range, 'out of range', '')),
+    })
+    issues = issues.loc[unparseable.to_numpy() | out_of_range.to_numpy()].reset_index(drop=True)
+    
+    df_clean = pd.DataFrame(prices.to_numpy().reshape(n_rows, n_cols),
+                            index=df_raw.index, columns=df_raw.columns)
+    return df_clean, issues
+
+def report_price_issues(rounds=None):
+    """Print the flagged price inputs from the last read, grouped by round.
 
+    Args:
+        rounds (iterable, optional): Only report the issues of these rounds. Defaults to all rounds.
+    """
+    df_issues = global_settings['price_issues']
+    if df_issues is None:
+        return
+    if rounds is not None:
+        df_issues = df_issues[df_issues['Round'].isin(list(rounds))]
+    if df_issues.empty:
+        return
+    print("--- Price inputs that could not be used ---")
+    for round_num, df_round in df_issues.groupby('Round'):
+        print(f"Round {round_num}:")
+        for _, row in df_round.iterrows():
+            print(f"  {row['Name']} ({row['ID']}): '{row['Raw']}' ({row['Issue']})")
+    print("-----------------------")
+    return
 
 def get_prices()->pd.DataFrame:
     # Read all the pricing data
     df_protected = global_settings['df_protected']
-    service = global_settings['service']
-    SPREADSHEET_ID = global_settings['SPREADSHEET_ID']
     sheet_name = 'Pricing'
     start_row = 2
-    end_row = 1 + df_protected.shape[0]
     start_col = 'A'
-    end_cols = 'L'
-    results = service.spreadsheets().values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f'{sheet_name}!{start_col}{start_row}:{end_cols}{end_row}'
-    ).execute()
-    values = results.get('values', [])
+    end_cols = col_num_to_letters(N_ROUNDS + 2)
+    values = read_range_paged(sheet_name, start_col, end_cols, start_row, n_rows=df_protected.shape[0])
         
     if not values:
         print('No price data found.')
@@ -474,11 +1381,15 @@ def get_prices()->pd.DataFrame:
     cols = ['Name', 'ID'] + [f'Price_{i}' for i in range(1, df_prices.shape[1] - 1)]
     df_prices.columns = cols
     # reindex to all prices
-    full_cols = ['Name', 'ID'] + [f'Price_{i}' for i in range(1, 11)]
-    df_prices = df_prices.reindex(columns=full_cols).fillna(np.nan)
-    # Make sure that all price columns are numeric
-    for i in range(1, 11):
-        df_prices[f'Price_{i}'] = pd.to_numeric(df_prices[f'Price_{i}'], errors='coerce')
+    full_cols = ['Name', 'ID'] + [f'Price_{i}' for i in range(1, N_ROUNDS + 1)]
+    df_prices = df_prices.reindex(columns=full_cols)
+    # Parse the whole price block at once and keep track of unusable inputs
+    price_cols = [f'Price_{i}' for i in range(1, N_ROUNDS + 1)]
+    df_clean, df_issues = sanitize_prices(df_prices[price_cols])
+    df_prices[price_cols] = df_clean
+    df_issues.insert(0, 'ID', df_prices['ID'].to_numpy()[df_issues['row']])
+    df_issues.insert(0, 'Name', df_prices['Name'].to_numpy()[df_issues['row']])
+    global_settings['price_issues'] = df_issues.drop(columns=['row'])
     return df_prices
 
 def advance_round(hard=False):
@@ -493,33 +1404,47 @@ def advance_round(hard=False):
     df_protected = global_settings['df_protected']
     
     df_prices = get_prices()
+    # keep what this round replaces, for the undo journal
+    df_protected_before = global_settings['df_protected']
+    df_prices_before = global_settings['df_prices']
+    pairing_before = (global_settings['df_pairs'], global_settings['residual_student'])
      
-    # Check if we have pairs assigned
+    # Check if we have pairs assigned, an empty pairing means nobody had submitted a price yet
     df_pairs = global_settings['df_pairs']
-    if df_pairs is None:
+    if df_pairs is None or df_pairs.empty:
+        # pairing sets the student rounds in place
+        df_protected_before = df_protected_before.copy()
         students_in_game = df_prices.dropna(subset=['Price_1'])['ID'].tolist()
         pair_students(students_in_game)
         df_pairs = global_settings['df_pairs']     
+    # work on a private copy so readers (e.g. the dashboard) never see a half-updated round
+    df_protected = global_settings['df_protected'].copy()
    
     # determine the current binding round
     binding_round = df_protected.loc[(df_protected['student_round'] > 0), 'student_round'].min()
     binding_round = 1 if binding_round is None else binding_round
-    binding_round = max(min(binding_round, 10), 1)
+    binding_round = max(min(binding_round, N_ROUNDS), 1)
     
     update_price_positions = []
+    processed_rounds = set()
     # Process each pair
     for _, pair in df_pairs.iterrows():
         s1_id = pair['Student1_ID']
         s2_id = pair['Student2_ID']
         residual = pair['Residual']
+        is_bot = pair['Bot'] != ''
         
         # Get the current round of the students
         source_pair_round = df_protected.loc[s1_id, 'student_round']
+        # pairs that finished the game wait for the others
+        if source_pair_round > N_ROUNDS:
+            continue
         # Determine how many rounds are we going to process
         if not hard:
             rounds = [source_pair_round]
         else:
             rounds = range(source_pair_round, binding_round + 1)
+        processed_rounds.update(rounds)
             
         for pair_round in rounds:
             # Then we check if they both have inputed prices for their current round
@@ -529,6 +1454,8 @@ def advance_round(hard=False):
             # Get prices for both students
             s1_price = df_prices.loc[df_prices['ID'] == s1_id, price_col_name].values
             s2_price = df_prices.loc[df_prices['ID'] == s2_id, price_col_name].values
+            if is_bot:
+                s2_price = [bot_price(s1_id, pair_round, df_prices, df_protected)]
 
             if len(s1_price) == 0 or pd.isna(s1_price[0]):
                 s1_price = None 
@@ -562,40 +1489,42 @@ def advance_round(hard=False):
             df_protected.loc[s1_id, 'Total Profit'] += s1_profit
             df_protected.loc[s1_id, 'student_round'] += 1
             
-            if not residual: 
+            if not residual and not is_bot: 
                 # Update df_protected for s2
                 df_protected.loc[s2_id, f'Round{pair_round}_RivalPrice'] = s1_price
                 df_protected.loc[s2_id, f'Round{pair_round}_MarketShare'] = s2_market_share
                 df_protected.loc[s2_id, f'Round{pair_round}_Profit'] = s2_profit
                 df_protected.loc[s2_id, 'Total Profit'] += s2_profit
                 df_protected.loc[s2_id, 'student_round'] += 1
+            elif is_bot:
+                df_protected.loc[s1_id, f'Round{pair_round}_BotProfit'] = s2_profit
+                df_protected.loc[s1_id, 'Bot Profit'] += s2_profit
+
+    # only the rounds looked at now, earlier rounds were reported when they were processed
+    report_price_issues(processed_rounds)
 
     # Update pending prices
     if len(update_price_positions) > 0:
         data = []
         df_students = global_settings['df_students']
-        ids = df_students['ID'].tolist()
-        for id_value, round_num, value in update_price_positions:
-            row_number = ids.index(id_value) + 2
-            col_letter = col_num_to_letters(round_num + 2)
+        id_to_row = {id_value: i + 2 for i, id_value in enumerate(df_students['ID'].tolist())}
+        for id_value, price_round, value in update_price_positions:
+            col_letter = col_num_to_letters(price_round + 2)
             sheet_name = 'Pricing'
-            cell_range = f'{sheet_name}!{col_letter}{row_number}'
+            cell_range = f'{sheet_name}!{col_letter}{id_to_row[id_value]}'
             data.append({
                 'range': cell_range,
                 'values': [[value]]
             })
-            
-            body = {
-                'valueInputOption': 'RAW',
-                'data': data
-            }
-            service = global_settings['service']
-            spreadsheet_id = global_settings['SPREADSHEET_ID']
-            result = service.spreadsheets().values().batchUpdate(
-                spreadsheetId=spreadsheet_id, body=body).execute()
+        execute_batch_update(data)
         
     # make sure that df_protected is updated
     global_settings['df_protected'] = df_protected.copy()
+    global_settings['df_prices'] = df_prices
+    global_settings['data_version'] += 1
+    record_round_delta(df_protected_before, df_prices_before, pairing_before, update_price_positions)
+    # refresh the figures of the pairs that changed in this round
+    update_plots(df_prices)
     df_protected = df_protected.reset_index(drop=False)
     # Update only the relevant column in each sheet
     # update rival prices
@@ -614,6 +1543,129 @@ def advance_round(hard=False):
     execute_batch_update(update_requests)
     return
 
+def changed_cells(df_before, df_after):
+    """Get the cells that differ between two frames of the same shape.
+
+    Returns:
+        tuple: The row and column positions of the changed cells, and their values before and after.
+    """
+    before = df_before.to_numpy(dtype=object)
+    after = df_after.to_numpy(dtype=object)
+    changed = ~((before == after) | (pd.isna(before) & pd.isna(after)))
+    rows, cols = np.nonzero(changed)
+    return rows, cols, before[rows, cols], after[rows, cols]
+
+def record_round_delta(df_protected_before, df_prices_before, pairing_before, update_price_positions):
+    """Record in the journal what the last advance_round changed, so it can be undone.
+
+    Only the changed cells of df_protected and df_prices are kept, together with the prices
+    carried forward into the Pricing sheet and the round counter. Updates that changed no
+    result are not recorded.
+    """
+    rows, cols, before, after = changed_cells(df_protected_before, global_settings['df_protected'])
+    
+    # carried forward prices replaced empty or unusable inputs
+    df_issues = global_settings['price_issues']
+    raw_inputs = {}
+    if df_issues is not None and not df_issues.empty:
+        raw_inputs = dict(zip(zip(df_issues['ID'], df_issues['Round']), df_issues['Raw']))
+    carried_prices = [(id_value, round_num, raw_inputs.get((id_value, round_num), ''), value)
+                      for id_value, round_num, value in update_price_positions]
+    if len(rows) == 0 and len(carried_prices) == 0:
+        return
+
+    df_prices_after = global_settings['df_prices']
+    if df_prices_before is None:
+        # before the first read, there were no prices
+        df_prices_before = df_prices_after.copy()
+        df_prices_before[[f'Price_{r}' for r in range(1, N_ROUNDS + 1)]] = np.nan
+    price_rows, price_cols, price_before, price_after = changed_cells(df_prices_before, df_prices_after)
+    
+    delta = {
+        'rows': rows,
+        'cols': cols,
+        'before': before,
+        'after': after,
+        'carried_prices': carried_prices,
+        'round_num': global_settings['round_num'],
+        'prices': (price_rows, price_cols, price_before, price_after),
+        'pairing': (pairing_before, (global_settings['df_pairs'], global_settings['residual_student']))
+    }
+    journal = global_settings['journal']
+    journal['undo'].append(delta)
+    # a new update invalidates whatever was undone before it
+    journal['redo'] = []
+    return
+
+def protected_cell_range(student_row, column):
+    """Get the A1 range of a df_protected cell in the output sheets, or None if it is not shown."""
+    row_number = student_row + 2
+    for sheet_name, key in [('Rival Prices', 'RivalPrice'), ('Market Shares', 'MarketShare'), ('Profits', 'Profit')]:
+        for r in range(1, N_ROUNDS + 1):
+            if column == f'Round{r}_{key}':
+                return f'{sheet_name}!{col_num_to_letters(r + 2)}{row_number}'
+    if column == 'Total Profit':
+        return f'Profits!{col_num_to_letters(N_ROUNDS + 3)}{row_number}'
+    return None
+
+def apply_round_delta(delta, undo=True):
+    """Apply a journal entry backwards (undo) or forwards (redo), in memory and on the sheets."""
+    side, other = (0, 1) if undo else (1, 0)
+    df_protected = global_settings['df_protected'].copy()
+    values = delta['before'] if undo else delta['after']
+    columns = df_protected.columns
+    update_requests = []
+    for row, col, value in zip(delta['rows'], delta['cols'], values):
+        df_protected.iat[row, col] = value
+        cell_range = protected_cell_range(row, columns[col])
+        if cell_range is not None:
+            update_requests.append({'range': cell_range, 'values': convert_to_serializable([[value]])})
+    
+    # restore the Pricing cells that were filled with carried forward prices
+    id_to_row = {id_value: i + 2 for i, id_value in enumerate(global_settings['df_students']['ID'].tolist())}
+    for id_value, round_num, raw_value, value in delta['carried_prices']:
+        cell_range = f'Pricing!{col_num_to_letters(round_num + 2)}{id_to_row[id_value]}'
+        update_requests.append({'range': cell_range, 'values': convert_to_serializable([[raw_value if undo else value]])})
+    
+    df_prices = global_settings['df_prices'].copy()
+    price_rows, price_cols, price_before, price_after = delta['prices']
+    for row, col, value in zip(price_rows, price_cols, price_before if undo else price_after):
+        df_prices.iat[row, col] = value
+    
+    global_settings['df_protected'] = df_protected
+    global_settings['df_prices'] = df_prices
+    global_settings['df_pairs'], global_settings['residual_student'] = delta['pairing'][side]
+    global_settings['round_num'] = delta['round_num'] if undo else delta['round_num'] + 1
+    global_settings['data_version'] += 1
+    if len(update_requests) > 0:
+        execute_batch_update(update_requests)
+    update_plots(global_settings['df_prices'])
+    return
+
+def undo_round():
+    """Undo the last advance_round. Returns True if there was something to undo."""
+    journal = global_settings['journal']
+    if len(journal['undo']) == 0:
+        print("Nothing to undo.")
+        return False
+    delta = journal['undo'].pop()
+    apply_round_delta(delta, undo=True)
+    journal['redo'].append(delta)
+    print(f"Undid the update of round {delta['round_num']}.")
+    return True
+
+def redo_round():
+    """Redo the last undone advance_round. Returns True if there was something to redo."""
+    journal = global_settings['journal']
+    if len(journal['redo']) == 0:
+        print("Nothing to redo.")
+        return False
+    delta = journal['redo'].pop()
+    apply_round_delta(delta, undo=False)
+    journal['undo'].append(delta)
+    print(f"Redid the update of round {delta['round_num']}.")
+    return True
+
 def show_pairs():
     """Show the assigned pairs."""
     df_pairs = global_settings['df_pairs']
@@ -638,7 +1690,7 @@ def update_game_results():
     df_protected = global_settings['df_protected']
     df_results = df_pairs.copy()
     df_results['Student1_TotalProfit'] = df_results['Student1_ID'].map(df_protected['Total Profit'])
-    df_results['Student2_TotalProfit'] = df_results['Student2_ID'].map(df_protected['Total Profit'])
+    df_results['Student2_TotalProfit'] = get_student2_total_profit(df_results, df_protected)
 
     # Write df_results to a new sheet
     new_sheet_name = 'GameResults'
@@ -663,10 +1715,10 @@ def update_game_results():
             body=body).execute()
         
     # Make sure that the sheet is empty
-    service.spreadsheets().values().clear(spreadsheetId=SPREADSHEET_ID, range=f'{new_sheet_name}!A1:Z1000', body={}).execute()
+    service.spreadsheets().values().clear(spreadsheetId=SPREADSHEET_ID, range=f'{new_sheet_name}!A1:Z', body={}).execute()
         
     # Cleanup the results
-    df_results.drop(columns=['Residual'], inplace=True)
+    df_results.drop(columns=['Residual', 'Bot'], inplace=True)
     # drop the ids
     df_results.drop(columns=['Student1_ID', 'Student2_ID'], inplace=True)
     # Rename the columns
@@ -683,12 +1735,10 @@ def update_game_results():
 
     # Write df_results to the new sheet
     results_values = [df_results.columns.tolist()] + df_results.values.tolist()
-    body = {
+    execute_batch_update([{
+        'range': f'{new_sheet_name}!A1',
         'values': results_values
-    }
-    service.spreadsheets().values().update(
-        spreadsheetId=SPREADSHEET_ID, range=f'{new_sheet_name}!A1',
-        valueInputOption='RAW', body=body).execute()
+    }])
     return
 
 def show_rankings(save=False):
@@ -706,10 +1756,7 @@ def show_rankings(save=False):
     if global_settings['df_pairs'] is None:
         print("No pairs have been assigned.")
         return
-    df_pairs = global_settings['df_pairs'].copy()
-    df_pairs['total_profit'] = df_pairs['Student1_ID'].map(df_protected['Total Profit']) + \
-        df_pairs['Student2_ID'].map(df_protected['Total Profit'])
-    df_pairs.sort_values('total_profit', ascending=False, inplace=True)
+    df_pairs = rank_pairs(global_settings['df_pairs'], df_protected)
     print(
         "\nTop 5 pairs by total profit:\n",
         f"{df_pairs[['Student1_Name', 'Student2_Name', 'total_profit']].head(5)}\n"
@@ -728,13 +1775,466 @@ def show_rankings(save=False):
         
     return
 
-def main():
+def save_price_history():
+    """Save the pair price history of the game, used by the collusion analytics."""
+    df_prices = global_settings['df_prices']
+    df_pairs = global_settings['df_pairs']
+    if df_prices is None or df_pairs is None:
+        return
+    output_dir = './game_results/'
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    section_name = global_settings['section_name']
+    game_abbrev = global_settings['game_abbrev']
+    today = global_settings['today']
+    pair_prices = get_pair_price_array(df_prices, df_pairs, global_settings['df_protected'])
+    n_pairs, _, n_rounds = pair_prices.shape
+    extra_plots = global_settings['extra_price_plot_lines']
+    df_history = pd.DataFrame({
+        'Section': section_name,
+        'Game': game_abbrev,
+        'Date': today,
+        'Pair': np.repeat(np.arange(n_pairs), n_rounds),
+        'Student1_ID': np.repeat(df_pairs['Student1_ID'].to_numpy(), n_rounds),
+        'Student2_ID': np.repeat(df_pairs['Student2_ID'].to_numpy(), n_rounds),
+        'Round': np.tile(np.arange(1, n_rounds + 1), n_pairs),
+        'Student1_Price': pair_prices[:, 0, :].ravel(),
+        'Student2_Price': pair_prices[:, 1, :].ravel(),
+        # competitive benchmark, the market clearing price when there is no pure NE
+        'NE': extra_plots.get('NE', extra_plots.get('Market clearing', np.nan)),
+        'Monopoly': extra_plots.get('Monopoly', np.nan)
+    })
+    history_file = f'{output_dir}/{section_name}_{game_abbrev}_{today}_price_history.csv'
+    df_history.to_csv(history_file, index=False)
+    return history_file
+
+def bootstrap_collusion(df_history, n_boot=2000, seed=0, chunk_size=250):
+    """Compute collusion indices of one game with bootstrap confidence intervals.
+
+    The collusion index of a round is (average pair price - NE) / (Monopoly - NE), so 0 is the
+    NE and 1 the monopoly price. Pair intervals resample the rounds of each pair, and the section
+    interval resamples pairs (clustering by pair).
+
+    Args:
+        df_history (pd.DataFrame): The price history of a single game, as saved by save_price_history.
+        n_boot (int, optional): Number of bootstrap resamples. Defaults to 2000.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        chunk_size (int, optional): Resamples drawn at once, to bound memory. Defaults to 250.
+
+    Returns:
+        tuple: A dataframe with the index and interval per pair, and a single-row dataframe for the game.
+    """
+    rng = np.random.default_rng(seed)
+    ne = df_history['NE'].iloc[0]
+    monopoly = df_history['Monopoly'].iloc[0]
+    df_history = df_history.sort_values(['Pair', 'Round'])
+    pair_ids = df_history['Pair'].unique()
+    n_pairs = len(pair_ids)
+    prices = df_history[['Student1_Price', 'Student2_Price']].to_numpy(dtype=float)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        round_index = (np.nanmean(prices, axis=1) - ne) / (monopoly - ne)
+        round_index = round_index.reshape(n_pairs, -1)
+        n_rounds = round_index.shape[1]
+        pair_index = np.nanmean(round_index, axis=1)
+
+        # resample rounds within each pair
+        pair_draws = []
+        for start in range(0, n_boot, chunk_size):
+            size = min(chunk_size, n_boot - start)
+            idx = rng.integers(0, n_rounds, size=(size, n_pairs, n_rounds))
+            pair_draws.append(np.nanmean(round_index[np.arange(n_pairs)[None, :, None], idx], axis=2))
+        pair_draws = np.concatenate(pair_draws, axis=0)
+        pair_low, pair_high = np.nanpercentile(pair_draws, [2.5, 97.5], axis=0)
+
+        # resample whole pairs for the section index
+        observed = pair_index[~np.isnan(pair_index)]
+        if len(observed) > 0:
+            section_draws = observed[rng.integers(0, len(observed), size=(n_boot, len(observed)))].mean(axis=1)
+            section_low, section_high = np.percentile(section_draws, [2.5, 97.5])
+            section_index = observed.mean()
+        else:
+            section_low = section_high = section_index = np.nan
+
+    df_pair_results = df_history.drop_duplicates('Pair')[['Section', 'Game', 'Date', 'Pair', 'Student1_ID', 'Student2_ID']].copy()
+    df_pair_results['Collusion Index'] = pair_index
+    df_pair_results['CI Low'] = pair_low
+    df_pair_results['CI High'] = pair_high
+    df_game_results = df_pair_results[['Section', 'Game', 'Date']].head(1).copy()
+    df_game_results['Pairs'] = len(observed)
+    df_game_results['Collusion Index'] = section_index
+    df_game_results['CI Low'] = section_low
+    df_game_results['CI High'] = section_high
+    return df_pair_results.reset_index(drop=True), df_game_results.reset_index(drop=True)
+
+def collusion_report(output_dir='./game_results/', n_boot=2000, max_workers=None):
+    """Compute the collusion indices of every archived game, spreading the games over a process pool.
+
+    Reads every '*_price_history.csv' in output_dir and writes 'collusion_pairs.csv' and
+    'collusion_sections.csv' next to them.
+    """
+    history_files = sorted(glob.glob(os.path.join(output_dir, '*_price_history.csv')))
+    if len(history_files) == 0:
+        print("No price histories found. Price histories are saved at the end of each game.")
+        return
+    df_history = pd.concat([pd.read_csv(f, dtype={'Student1_ID': str, 'Student2_ID': str}) for f in history_files],
+                           ignore_index=True)
+    games = [df_game for _, df_game in df_history.groupby(['Section', 'Game', 'Date'], sort=True)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(bootstrap_collusion, games, [n_boot] * len(games), range(len(games))))
+    df_pair_results = pd.concat([r[0] for r in results], ignore_index=True)
+    df_game_results = pd.concat([r[1] for r in results], ignore_index=True)
+    df_pair_results.to_csv(os.path.join(output_dir, 'collusion_pairs.csv'), index=False)
+    df_game_results.to_csv(os.path.join(output_dir, 'collusion_sections.csv'), index=False)
+    print(
+        "----------------------\n"
+        "Collusion index per game (0 = NE, 1 = Monopoly, 95% bootstrap interval clustered by pair):\n",
+        f"{df_game_results.round(3).to_string(index=False)}\n"
+    )
+    print("----------------------")
+    return
+
+def build_report_history():
+    """Precompute the history of every student as arrays shared by all the report workers.
+
+    Returns:
+        dict: Names, ranks, totals and (students, rounds) arrays of prices, rival prices,
+            market shares, profits and rival profits, plus the index of each student's rival
+            (-1 for bots).
+    """
+    df_protected = global_settings['df_protected']
+    df_pairs = global_settings['df_pairs']
+    df_prices = global_settings['df_prices']
+    rounds = range(1, N_ROUNDS + 1)
+    ids = df_protected.index
+    position = pd.Series(np.arange(len(ids)), index=ids)
+
+    profits = df_protected[[f'Round{r}_Profit' for r in rounds]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    rival_prices = df_protected[[f'Round{r}_RivalPrice' for r in rounds]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    shares = df_protected[[f'Round{r}_MarketShare' for r in rounds]].apply(
+        lambda col: pd.to_numeric(col.astype(str).str.rstrip('%'), errors='coerce') / 100).to_numpy(dtype=float)
+    prices = df_prices.drop_duplicates('ID').set_index('ID')[[f'Price_{r}' for r in rounds]].reindex(ids).to_numpy(dtype=float)
+    # only keep the prices of rounds that were played
+    prices[np.isnan(profits)] = np.nan
+
+    rivals = np.full(len(ids), -1)
+    for _, pair in df_pairs.iterrows():
+        s1 = position[pair['Student1_ID']]
+        s2 = position.get(pair['Student2_ID'], -1)
+        rivals[s1] = s2
+        if s2 >= 0 and not pair['Residual']:
+            rivals[s2] = s1
+    # the profits of a bot rival are kept with the student it plays against
+    bot_profits = df_protected[[f'Round{r}_BotProfit' for r in rounds]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    rival_profits = np.where((rivals >= 0)[:, None], profits[rivals], bot_profits)
+    total_profit = df_protected['Total Profit'].to_numpy(dtype=float)
+    ranks = pd.Series(total_profit).rank(ascending=False, method='min').to_numpy(dtype=int)
+    return {
+        'names': df_protected['Name'].tolist(),
+        'rival_names': [df_protected['Name'].iloc[r] if r >= 0 else 'Bot' for r in rivals],
+        'section_name': global_settings['section_name'],
+        'game_abbrev': global_settings['game_abbrev'],
+        'extra_price_plot_lines': global_settings['extra_price_plot_lines'],
+        'prices': prices,
+        'rival_prices': rival_prices,
+        'shares': shares,
+        'profits': profits,
+        'rival_profits': rival_profits,
+        'rivals': rivals,
+        'total_profit': total_profit,
+        'ranks': ranks
+    }
+
+def svg_line_chart(series, title, ylabel, hlines=None, width=560, height=280):
+    """Draw a simple inline SVG line chart of per-round values.
+
+    Args:
+        series (list): (label, values, color, dashed) tuples, NaN values are skipped.
+        title (str): The chart title.
+        ylabel (str): The y axis label.
+        hlines (dict, optional): Label -> value of horizontal reference lines.
+    """
+    hlines = hlines or {}
+    left, right, top, bottom = 60, 110, 30, 40
+    values = np.concatenate([np.asarray(v, dtype=float) for _, v, _, _ in series] + [np.asarray(list(hlines.values()), dtype=float)])
+    values = values[~np.isnan(values)]
+    y_low = min(values.min(), 0.0) if len(values) > 0 else 0.0
+    y_high = values.max() if len(values) > 0 else 1.0
+    y_high = y_high if y_high > y_low else y_low + 1.0
+    n_rounds = max(len(v) for _, v, _, _ in series)
+
+    def x_pos(r):
+        return left + (width - left - right) * (r - 1) / max(n_rounds - 1, 1)
+
+    def y_pos(v):
+        return top + (height - top - bottom) * (1 - (v - y_low) / (y_high - y_low))
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" font-size="11">',
+             f'<text x="{width / 2:.0f}" y="16" text-anchor="middle" font-size="13">{html.escape(title)}</text>',
+             f'<line x1="{left}" y1="{height - bottom}" x2="{width - right}" y2="{height - bottom}" stroke="black"/>',
+             f'<line x1="{left}" y1="{top}" x2="{left}" y2="{height - bottom}" stroke="black"/>',
+             f'<text x="14" y="{height / 2:.0f}" transform="rotate(-90 14 {height / 2:.0f})" text-anchor="middle">{html.escape(ylabel)}</text>',
+             f'<text x="{(width - right + left) / 2:.0f}" y="{height - 6}" text-anchor="middle">Round</text>']
+    for r in range(1, n_rounds + 1):
+        parts.append(f'<text x="{x_pos(r):.1f}" y="{height - bottom + 14}" text-anchor="middle">{r}</text>')
+    for v in np.linspace(y_low, y_high, 5):
+        parts.append(f'<text x="{left - 4}" y="{y_pos(v) + 4:.1f}" text-anchor="end">{v:,.0f}</text>')
+    legend = []
+    for label, v in hlines.items():
+        color = {'NE': 'red', 'Monopoly': 'green'}.get(label, 'black')
+        parts.append(f'<line x1="{left}" y1="{y_pos(v):.1f}" x2="{width - right}" y2="{y_pos(v):.1f}" stroke="{color}" stroke-dasharray="4 3"/>')
+        legend.append((label, color, True))
+    for label, v, color, dashed in series:
+        points = ' '.join(f'{x_pos(r):.1f},{y_pos(y):.1f}' for r, y in enumerate(v, start=1) if not np.isnan(y))
+        dash = ' stroke-dasharray="6 3"' if dashed else ''
+        parts.append(f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="2"{dash}/>')
+        legend.append((label, color, dashed))
+    for i, (label, color, dashed) in enumerate(legend):
+        y = top + 14 * i + 4
+        dash = ' stroke-dasharray="4 3"' if dashed else ''
+        parts.append(f'<line x1="{width - right + 8}" y1="{y}" x2="{width - right + 26}" y2="{y}" stroke="{color}" stroke-width="2"{dash}/>')
+        parts.append(f'<text x="{width - right + 30}" y="{y + 4}">{html.escape(str(label))}</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+# history of the game, set once per report worker
+report_history = None
+
+
+def init_report_worker(history):
+    """Store the shared history in the report worker process."""
+    global report_history
+    report_history = history
+
+def write_student_reports(student_indices, report_dir):
+    """Write the HTML reports of the given students (runs in a report worker process)."""
+    history = report_history
+    n_students = len(history['names'])
+    paths = []
+    for i in student_indices:
+        name = history['names'][i]
+        rival_name = history['rival_names'][i]
+        rival_profits = history['rival_profits'][i]
+        first_name = str(name).split()[0] if str(name).strip() else str(name)
+        rival_first_name = str(rival_name).split()[0] if str(rival_name).strip() else str(rival_name)
+        price_chart = svg_line_chart(
+            [(first_name, history['prices'][i], '#1f77b4', False),
+             (rival_first_name, history['rival_prices'][i], '#ff7f0e', True)],
+            'Prices', 'Price', hlines=history['extra_price_plot_lines'])
+        profit_chart = svg_line_chart(
+            [(first_name, history['profits'][i], '#1f77b4', False),
+             (rival_first_name, rival_profits, '#ff7f0e', True)],
+            'Profits', 'Profit')
+        share_chart = svg_line_chart(
+            [(first_name, 100 * history['shares'][i], '#1f77b4', False)],
+            'Market share', 'Share (%)')
+        share_text = ['' if np.isnan(share) else f'{share:.1%}' for share in history['shares'][i]]
+        rows = ''.join(
+            f"<tr><td>{r}</td><td>{convert_to_serializable(history['prices'][i][r - 1])}</td>"
+            f"<td>{convert_to_serializable(history['rival_prices'][i][r - 1])}</td>"
+            f"<td>{share_text[r - 1]}</td>"
+            f"<td>{convert_to_serializable(history['profits'][i][r - 1])}</td>"
+            f"<td>{convert_to_serializable(rival_profits[r - 1])}</td></tr>"
+            for r in range(1, history['profits'].shape[1] + 1)
+        )
+        page = (
+            f"<html><head><meta charset='utf-8'><title>{html.escape(str(name))}</title></head><body style='font-family:sans-serif'>"
+            f"<h1>{html.escape(str(name))}</h1>"
+            f"<p>{html.escape(str(history['section_name']))} - {html.escape(str(history['game_abbrev']))}</p>"
+            f"<p>Rival: {html.escape(str(rival_name))}</p>"
+            f"<p><b>Total profit: {history['total_profit'][i]:,.1f}</b> - Rank {history['ranks'][i]} of {n_students}</p>"
+            f"{price_chart}{profit_chart}{share_chart}"
+            "<table border='1' cellspacing='0' cellpadding='4'><tr><th>Round</th><th>Your price</th><th>Rival price</th>"
+            f"<th>Your share</th><th>Your profit</th><th>Rival profit</th></tr>{rows}</table>"
+            "</body></html>"
+        )
+        path = os.path.join(report_dir, f"{i + 1:04d}_{str(name).replace(' ', '_').lower()}.html")
+        with open(path, 'w', encoding='utf-8') as report_file:
+            report_file.write(page)
+        paths.append(path)
+    return paths
+
+def generate_student_reports(max_workers=None, chunk_size=25):
+    """Write one self-contained HTML feedback report per student, using a process pool."""
+    if global_settings['df_pairs'] is None or global_settings['df_prices'] is None:
+        return
+    section_name = global_settings['section_name']
+    game_abbrev = global_settings['game_abbrev']
+    today = global_settings['today']
+    report_dir = f'reports/{section_name}/{game_abbrev}_{today}'
+    if not os.path.exists(report_dir):
+        os.makedirs(report_dir)
+    history = build_report_history()
+    n_students = len(history['names'])
+    chunks = [range(start, min(start + chunk_size, n_students)) for start in range(0, n_students, chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_report_worker, initargs=(history,)) as executor:
+        n_reports = sum(len(paths) for paths in executor.map(write_student_reports, chunks, [report_dir] * len(chunks)))
+    print(f"{n_reports} student reports saved in {report_dir}")
+    return
+
+def get_dashboard_signatures() -> dict:
+    """Get the signature of the data shown by each dashboard artifact, keyed by path.
+
+    The signatures are recomputed once per data version, and an artifact is only re-rendered
+    when its own signature changed.
+    """
+    version = global_settings['data_version']
+    with dashboard_cache['lock']:
+        cached = dashboard_cache['signatures']
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df_prices = global_settings['df_prices']
+        df_pairs = global_settings['df_pairs']
+        df_protected = global_settings['df_protected']
+        signatures = {}
+        if df_prices is not None and df_pairs is not None:
+            plot_signatures = get_plot_signatures(df_prices, df_pairs, df_protected)
+            signatures = {f'/pair/{index}.png': plot_signatures[('pair', index)] for index in df_pairs.index}
+            signatures['/average_prices.png'] = plot_signatures['average_prices']
+        order = rank_pairs(df_pairs, df_protected).index.tolist() if df_pairs is not None else []
+        leaderboard = pd.util.hash_pandas_object(df_protected[['Name', 'Total Profit']].astype(str)).sum()
+        signatures['/'] = (global_settings['round_num'], leaderboard, tuple(order),
+                           tuple(signatures.get(f'/pair/{index}.png') for index in order))
+        signatures = {path: hashlib.sha1(repr(signature).encode()).hexdigest()[:16]
+                      for path, signature in signatures.items()}
+        dashboard_cache['signatures'] = (version, signatures)
+        return signatures
+
+def render_dashboard_page() -> bytes:
+    """Render the dashboard HTML page with the leaderboard and links to the charts."""
+    section_name = html.escape(str(global_settings['section_name']))
+    signatures = get_dashboard_signatures()
+    df_protected = global_settings['df_protected'].sort_values('Total Profit', ascending=False)
+    rows = ''.join(
+        f"<tr><td>{rank}</td><td>{html.escape(str(row['Name']))}</td><td>{row['Total Profit']:.1f}</td></tr>"
+        for rank, (_, row) in enumerate(df_protected.iterrows(), start=1)
+    )
+    pair_imgs = ''
+    if global_settings['df_pairs'] is not None:
+        df_pairs = rank_pairs(global_settings['df_pairs'], global_settings['df_protected'])
+        pair_imgs = ''.join(
+            f"<h3>{html.escape(str(pair['Student1_Name']))} - {html.escape(str(pair['Student2_Name']))}</h3>"
+            f"<img src='/pair/{index}.png?v={signatures.get(f'/pair/{index}.png')}' width='900'>"
+            for index, pair in df_pairs.iterrows()
+        )
+    page = dedent(f"""
+    <html><head><meta http-equiv="refresh" content="15"><title>{section_name}</title></head>
+    <body>
+    <h1>[{section_name}] Round {global_settings['round_num']}</h1>
+    <h2>Leaderboard</h2>
+    <table><tr><th>#</th><th>Name</th><th>Total Profit</th></tr>{rows}</table>
+    <h2>Average Price per Round</h2>
+    <img src="/average_prices.png?v={signatures.get('/average_prices.png')}" width="900">
+    <h2>Pairs</h2>
+    {pair_imgs}
+    </body></html>
+    """)
+    return page.encode('utf-8')
+
+def render_dashboard_figure(path) -> bytes:
+    """Render one of the dashboard charts as PNG bytes, or None if the path is unknown."""
+    df_prices = global_settings['df_prices']
+    if df_prices is None:
+        return None
+    if path == '/average_prices.png':
+        fig = make_average_price_figure(df_prices)
+    elif path.startswith('/pair/') and path.endswith('.png'):
+        df_pairs = global_settings['df_pairs']
+        try:
+            pair = df_pairs.loc[int(path[len('/pair/'):-len('.png')])]
+        except (ValueError, KeyError, AttributeError):
+            return None
+        fig = make_pair_figure(pair, df_prices, global_settings['df_protected'])
+    else:
+        return None
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+def get_dashboard_artifact(path):
+    """Get a dashboard artifact from the cache, rendering it only if the data it shows changed.
+
+    Artifacts are rendered outside of the cache lock, under a lock per path, so that a chart
+    being rendered does not hold up requests for the others.
+
+    Returns:
+        tuple: (body, content type, etag), or None if the path is unknown.
+    """
+    signature = get_dashboard_signatures().get(path)
+    if signature is None:
+        return None
+    with dashboard_cache['lock']:
+        entry = dashboard_cache['entries'].get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        path_lock = dashboard_cache['path_locks'].setdefault(path, threading.Lock())
+    with path_lock:
+        # another request may have rendered it while we waited
+        with dashboard_cache['lock']:
+            entry = dashboard_cache['entries'].get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        if path == '/':
+            body, content_type = render_dashboard_page(), 'text/html; charset=utf-8'
+        else:
+            body, content_type = render_dashboard_figure(path), 'image/png'
+        if body is None:
+            return None
+        artifact = (body, content_type, f'"{signature}"')
+        with dashboard_cache['lock']:
+            dashboard_cache['entries'][path] = (signature, artifact)
+        return artifact
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """Serve the cached dashboard artifacts with ETag revalidation."""
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        artifact = get_dashboard_artifact(path)
+        if artifact is None:
+            self.send_error(404)
+            return
+        body, content_type, etag = artifact
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the terminal clean for the game menu
+        return
+
+def start_dashboard(port=8000, host='127.0.0.1'):
+    """Start the live dashboard server in a background thread.
+
+    Args:
+        port (int, optional): The port to listen on. Defaults to 8000.
+        host (str, optional): The interface to listen on. The dashboard shows student names and
+            profits, so it is only served to this machine unless another host is given (e.g.
+            '0.0.0.0' for the whole network). Defaults to '127.0.0.1'.
+    """
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    shown_host = 'localhost' if host == '127.0.0.1' else host
+    print(f"Dashboard running at http://{shown_host}:{server.server_address[1]}/")
+    return server
+
+def main(dashboard_port=None, term=None, dashboard_host='127.0.0.1'):
     """Main function to run the game app."""
     # Load the service
     load_service()
     
     # Get the settings
-    settings = load_section_settings()
+    settings = load_section_settings(term)
     
     if len(settings) == 0:
         print("No sections registered. Please register your section first usng the --register option.")
@@ -745,94 +2245,47 @@ def main():
     
     # Read the student data from 'Pricing'
     load_students()
+    
+    if dashboard_port is not None:
+        start_dashboard(dashboard_port, dashboard_host)
 
     # Ask to start the game and select mode
     section_name = global_settings['section_name']
     print(f"Starting game for section {section_name}")
 
-    mode = clean_input("Select game mode:\n"
-                 "(a) Homogenous Bertrand \n"
-                 "(b) Hotelling \n"
-                 ).lower()
+    # Offer to repeat the last game of the section
+    record = global_settings['section_record']
+    mode = None
+    if record['last_mode'] in DEMAND_MODELS and record['last_game_settings']:
+        last_settings = json.loads(record['last_game_settings'])
+        last_label = ', '.join(f'{name}={value}' for name, value in last_settings.items())
+        reuse = clean_input(f"Repeat the last game ({DEMAND_MODELS[record['last_mode']]['label']}: {last_label})? (y/n) ")
+        if reuse == 'y':
+            mode = record['last_mode']
+            game_settings = last_settings
     
-    if mode not in ['a', 'b']:
-        print("Invalid mode selected.")
-        raise ValueError("Invalid mode selected.")
-    
-    if mode == 'a':
-        alpha = clean_input("Choose the demand slope parameter alpha (or press Enter for default 1): ")
-        if len(alpha) == 0:
-            alpha = 1
-        else:
-            alpha = float(alpha)
-            
-        c = clean_input("Choose the marginal cost c (or press Enter for default 0): ")
-        if len(c) == 0:
-            c = 0
-        else:
-            c = float(c)
-        global_settings['game_settings'] = {'alpha': alpha, 'c': c}
-        global_settings['game_abbrev'] = f'bertrand_alpha{alpha}_c{c}'
-        global_settings['extra_price_plot_lines'] = {
-            'NE': c,
-            'Monopoly': (100 + c) / 2.0 
-        }
-    elif mode == 'b':
-        setting = clean_input("Choose a Hotelling Setup:\n"
-                              "(a) High transport cost (t=1, c=0, v=200)\n"
-                              "(b) Low transport cost (t=.5, c=0, v=200)\n"
-                              "(c) Custom\n")
-        if setting not in ['a', 'b', 'c']:
-            print("Invalid setting selected.")
-            raise ValueError("Invalid setting selected.")
-        if setting == 'c':
-            t = clean_input("Choose the transport cost t (or press Enter for default 1): ")
-            if len(t) == 0:
-                t = 1
-            else:
-                t = float(t)
-            c = clean_input("Choose the marginal cost c (or press Enter for default 0): ")
-            if len(c) == 0:
-                c = 0
-            else:
-                c = float(c)
-            v = clean_input("Choose the location of the firms v (or press Enter for default 4): ")
-            if len(v) == 0:
-                v = 4
-            else:
-                v = float(v)
-            global_settings['game_settings'] = {'t': t, 'c': c, 'v': v}
-            global_settings['extra_price_plot_lines'] = {
-                'NE': c + 100 * t,
-            }
-        elif setting == 'a':
-            # Monopoly price is 150, NE is 100
-            t = 1
-            c = 0
-            v = 200
-            global_settings['game_settings'] = {'t': t, 'c': c, 'v': v}
-            global_settings['extra_price_plot_lines'] = {
-                'NE': c + 100 * t,
-                'Monopoly': 150
-            }
-        elif setting == 'b':
-            # monopoly price is 175, NE is 50
-            t = .5
-            c = 0
-            v = 200
-            global_settings['game_settings'] = {'t': t, 'c': c, 'v': v}
-            global_settings['extra_price_plot_lines'] = {
-                'NE': c + 100 * t,
-                'Monopoly': 175
-            }
-        global_settings['game_abbrev'] = f'hotelling_t{t}_c{c}_v{v}' 
-    
-    mode_map = {
-        'a': 'bertrand',
-        'b': 'hotelling',
-    }
-    mode = mode_map[mode]
+    if mode is None:
+        mode_map = dict(zip('abcdefghijklmnopqrstuvwxyz', DEMAND_MODELS.keys()))
+        mode = clean_input("Select game mode:\n" + "".join(
+            f"({letter}) {DEMAND_MODELS[name]['label']} \n" for letter, name in mode_map.items()
+        )).lower()
+        
+        if mode not in mode_map:
+            print("Invalid mode selected.")
+            raise ValueError("Invalid mode selected.")
+        
+        mode = mode_map[mode]
+        game_settings = prompt_for_game_settings(mode)
+    model = DEMAND_MODELS[mode]
+    update_section(section_name, last_mode=mode, last_game_settings=json.dumps(game_settings))
+    global_settings['game_settings'] = game_settings
+    global_settings['game_abbrev'] = mode + ''.join(f'_{name}{game_settings[name]}' for name, _, _ in model['params'])
+    global_settings['extra_price_plot_lines'] = model['benchmarks'](game_settings)
     global_settings['mode'] = mode
+    # compile the demand kernel now rather than in the first round
+    demand_and_profits_array(np.zeros(1), np.zeros(1))
+    
+    prompt_for_bot()
 
 
 
@@ -844,7 +2297,7 @@ def main():
         df_protected = global_settings['df_protected']
         binding_round = df_protected.loc[(df_protected['student_round'] > 0), 'student_round'].min()
         binding_round = 1 if np.isnan(binding_round) else binding_round
-        if binding_round > 10:
+        if binding_round > N_ROUNDS:
             print("All rounds have been completed.")
             break
         print(f"\n[{section_name}] - Round {round_num} - Binding Round {binding_round}\n"
@@ -854,13 +2307,23 @@ def main():
                        "(b) force update, setting missing prices to previous input (hard)\n"
                        "(c) see current rankings\n"
                        "(d) show assigned pairs\n"
-                       "(e) end game \n").lower()
-        if option not in ['a', 'b', 'c', 'd', 'e']:
+                       "(e) end game \n"
+                       "(f) undo last update\n"
+                       "(g) redo last undone update\n").lower()
+        if option not in ['a', 'b', 'c', 'd', 'e', 'f', 'g']:
             print("Invalid option selected.")
             continue
         elif option == 'e':
             print("Game ended.")
             break
+        elif option == 'f':
+            if undo_round():
+                round_num = global_settings['round_num']
+            continue
+        elif option == 'g':
+            if redo_round():
+                round_num = global_settings['round_num']
+            continue
         elif option == 'd':
             show_pairs()
             continue
@@ -883,6 +2346,10 @@ def main():
      
     # print the highest profit student and the highest profit pair
     show_rankings(save=True)
+    history_file = save_price_history()
+    if history_file is not None:
+        update_section(section_name, checkpoint=history_file)
+    generate_student_reports()
     
     # Create a DataFrame for the pairs and total profits
     plot_student_pairs()
@@ -896,11 +2363,12 @@ if __name__ == '__main__':
     ---- Setup ---- 
     Before class, you must register your section sheet using
     
-    python main.py --register "Section Name" "Section Sheet ID"
+    python main.py --register "Section Name" "Section Sheet ID" [--term "Term"]
     
     Where "Section Name" is the name of the section and "Section Sheet ID" is the ID of the Google Sheet,
     which is the string in the URL after 'https://docs.google.com/spreadsheets/d/' and before '/edit'.
     See the README.md file for more information.
+    Registered sections can be listed with --list-sections and removed with --remove-section "Section Name".
    
     ---- Running the Game ----
     To run the game, simply run
@@ -909,7 +2377,18 @@ if __name__ == '__main__':
     The script will ask you which section to run the game for and the proceed to select a game mode.
     By default each game runs 10 rounds, but you can exit at any time.
     Plots of prices and profits will be generated for each pair of students and stored in the 'plots' folder, 
-    with a subfolder for each section.
+    with a subfolder for each section. Plots are refreshed in the background after every round, so they
+    are ready as soon as the game ends.
+    
+    To follow the game live (leaderboard, average price and pair charts) run
+    python main.py --dashboard [PORT]
+    and open http://localhost:8000/ (or the chosen port) in a browser. The dashboard is only served
+    to this machine; add --dashboard-host 0.0.0.0 to share it with the local network.
+    
+    ---- Collusion Report ----
+    Price histories of every game are stored in the 'game_results' folder. To measure how close each
+    pair and section got to the monopoly price, relative to the NE, run
+    python main.py --collusion-report
 
     ---- Game Modes ----
     The game offers the following modes of play:
@@ -926,6 +2405,17 @@ if __name__ == '__main__':
             s_1(p_1, p_2) = 1/2 + (p_1 - p_2) / (200 * t)
         and the NE is p_1 = p_2 = c + 100 * t. 
     
+    c) Logit model:
+        Consumers choose between both products and an outside option with logit shares
+            s_1(p_1, p_2) = exp((v - p_1) / mu) / (1 + exp((v - p_1) / mu) + exp((v - p_2) / mu))
+        NE and monopoly prices are computed numerically.
+    
+    d) Linear differentiated Bertrand:
+        Each firm faces the demand q_1 = a - b * p_1 + d * p_2, with NE p = (a + b * c) / (2b - d).
+    
+    e) Bertrand-Edgeworth:
+        Homogenous Bertrand where each firm can serve at most a share k of the market. The firm
+        with the higher price serves the residual demand.
     
     In all games the total demand is set to 100.
 
@@ -933,13 +2423,36 @@ if __name__ == '__main__':
     
     parser.add_argument("--register", type=str, nargs=2,
                         help="register a section with the given name and sheet ID")
+    parser.add_argument("--term", type=str, default=None,
+                        help="term of the section to register, or only list and run sections of this term")
+    parser.add_argument("--list-sections", action='store_true',
+                        help="list the registered sections")
+    parser.add_argument("--remove-section", type=str, default=None, metavar="SECTION_NAME",
+                        help="remove a registered section")
+    parser.add_argument("--plots", type=str, choices=['pairs', 'class', 'both', 'none'], default='pairs',
+                        help="plots to produce: one file per pair, class-wide figures, both, or none")
+    parser.add_argument("--collusion-report", action='store_true',
+                        help="compute collusion indices with bootstrap intervals for all archived games")
+    parser.add_argument("--n-boot", type=int, default=2000,
+                        help="number of bootstrap resamples of the collusion report (default 2000)")
+    parser.add_argument("--dashboard", type=int, nargs='?', const=8000, default=None, metavar="PORT",
+                        help="serve a live dashboard on localhost (default port 8000)")
+    parser.add_argument("--dashboard-host", type=str, default='127.0.0.1', metavar="HOST",
+                        help="interface the dashboard listens on, e.g. 0.0.0.0 for the local network")
     args = parser.parse_args()
     
     if args.register:
         section_name, section_sheet_id = args.register
-        register_section(section_name, section_sheet_id)
+        register_section(section_name, section_sheet_id, args.term)
+    elif args.list_sections:
+        list_sections(args.term)
+    elif args.remove_section:
+        remove_section(args.remove_section)
+    elif args.collusion_report:
+        collusion_report(n_boot=args.n_boot)
     else:
-        main()  
+        global_settings['plot_mode'] = args.plots
+        main(dashboard_port=args.dashboard, term=args.term, dashboard_host=args.dashboard_host)  
         
 # End of main.py
     